@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Benchmark the dashboard queries of a project generated by generate_project.py, in a local DuckDB.
+
+The project's sources are loaded and its models materialized the way Rill does, each step timed.
+Then the queries an explore dashboard sends over its default P12M range are run against every
+metrics view: the totals of all measures, their timeseries, each measure by each dimension, and a
+top-N leaderboard of each dimension by each measure. Each query is run several times after a
+warm-up, and the latency percentiles of each kind of query are reported along with the
+materialization times, in a JSON and a CSV file that can be compared against a previous baseline.
+
+Usage:
+    python benchmark_dashboard.py owner/repo [owner/other-repo ...] [--name NAME] [--project-dir DIR]
+                                  [--repeat N] [--top-n N] [--output PATH]
+
+Examples:
+    # Benchmark the project generated with: python generate_project.py duckdb/duckdb --local
+    python benchmark_dashboard.py duckdb/duckdb
+
+    # Record a baseline, then compare another layout or model against it
+    python benchmark_dashboard.py duckdb/duckdb --output benchmarks/dashboard-baseline.json
+    python benchmark_dashboard.py duckdb/duckdb --baseline benchmarks/dashboard-baseline.json --max-regression 10
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import time
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import yaml
+
+from benchmark_download import compare, write_results
+from generate_project import sanitize_name
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+PERCENTILES = [50, 90, 99]
+
+# The time range of the generated explores
+TIME_RANGE = "12 MONTH"
+
+
+def percentile(values, p):
+    """The p-th percentile of the values, by nearest rank."""
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))]
+
+
+def render_sql(sql):
+    """The SQL of a model as built from scratch, without its incremental parts."""
+    return re.sub(r"\{\{\s*if incremental\s*\}\}.*?\{\{\s*end\s*\}\}", "", sql, flags=re.DOTALL)
+
+
+def source_sql(con, source):
+    """The SQL reading a source or YAML model file."""
+    if "sql" in source:
+        return render_sql(source["sql"])
+    uri = source["uri"]
+    if source.get("extract", {}).get("files", {}).get("strategy") == "tail":
+        # Like Rill, read only the last file matching the pattern
+        size = source["extract"]["files"].get("size", 1)
+        files = [row[0] for row in con.execute(f"SELECT file FROM glob('{uri}') ORDER BY file DESC LIMIT {size}").fetchall()]
+        return f"SELECT * FROM read_parquet({files!r})"
+    return f"SELECT * FROM read_parquet('{uri}')"
+
+
+def materialize(con, name, sql):
+    """Create a table from a query, returning the seconds it took and its number of rows."""
+    start = time.perf_counter()
+    con.execute(f"CREATE OR REPLACE TABLE {name} AS {sql}")
+    seconds = time.perf_counter() - start
+    rows = con.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
+    logger.info(f"Materialized {name}: {rows} rows in {seconds:.2f}s")
+    return seconds, rows
+
+
+def materialize_project(con, name):
+    """Load the sources and materialize the models of a generated project, in dependency order."""
+    steps = []
+    for path in [Path(f"sources/{name}_commits_source.yaml"), Path(f"sources/{name}_modified_files.yaml")]:
+        if path.exists():
+            with open(path) as f:
+                sql = source_sql(con, yaml.safe_load(f))
+            steps.append((path.stem, sql))
+    for model in [f"{name}_commits_model", f"{name}_commits_daily"]:
+        if Path(f"models/{model}.sql").exists():
+            steps.append((model, Path(f"models/{model}.sql").read_text()))
+        elif Path(f"models/{model}.yaml").exists():
+            with open(f"models/{model}.yaml") as f:
+                steps.append((model, render_sql(yaml.safe_load(f)["sql"])))
+    if not any(step == f"{name}_commits_model" for step, _ in steps):
+        raise FileNotFoundError(f"No model {name}_commits_model in {os.getcwd()}, run generate_project.py first")
+    return {step: materialize(con, step, sql) for step, sql in steps}
+
+
+def dashboard_queries(con, metrics_view, top_n=10):
+    """The queries an explore sends for a metrics view over its default time range, as (kind, label, sql)."""
+    table = metrics_view["model"]
+    timeseries = metrics_view["timeseries"]
+    dimensions = {dimension["name"]: dimension.get("expression") or dimension["column"] for dimension in metrics_view["dimensions"]}
+    measures = {measure["name"]: measure["expression"] for measure in metrics_view["measures"]}
+
+    # Like Rill, the range ends at the latest time in the data
+    end = con.execute(f"SELECT max({timeseries}) FROM {table}").fetchone()[0]
+    where = f"WHERE {timeseries} > TIMESTAMP '{end}' - INTERVAL {TIME_RANGE} AND {timeseries} <= TIMESTAMP '{end}'"
+    all_measures = ", ".join(f"{expression} AS {measure}" for measure, expression in measures.items())
+
+    queries = [
+        ("totals", "all measures", f"SELECT {all_measures} FROM {table} {where}"),
+        ("timeseries", "all measures by day",
+         f"SELECT date_trunc('day', {timeseries}) AS ts, {all_measures} FROM {table} {where} GROUP BY ALL ORDER BY ts"),
+    ]
+    for dimension, dimension_expression in dimensions.items():
+        for measure, expression in measures.items():
+            queries.append((
+                "breakdown", f"{measure} by {dimension}",
+                f"SELECT {dimension_expression} AS {dimension}, {expression} AS {measure} FROM {table} {where} "
+                f"GROUP BY ALL ORDER BY {dimension}",
+            ))
+            queries.append((
+                "leaderboard", f"top {top_n} {dimension} by {measure}",
+                f"SELECT {dimension_expression} AS {dimension}, {expression} AS {measure} FROM {table} {where} "
+                f"GROUP BY ALL ORDER BY {measure} DESC NULLS LAST LIMIT {top_n}",
+            ))
+    return queries
+
+
+def run_query(con, sql, repeat):
+    """Run a query once to warm up, then `repeat` times, returning the seconds of each timed run."""
+    con.execute(sql).fetchall()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        con.execute(sql).fetchall()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarize(rows, materialization):
+    """Latency percentiles of each kind of query of each metrics view, and the materialization times."""
+    summary = {f"materialize {step}": {"seconds": seconds, "rows": rows} for step, (seconds, rows) in materialization.items()}
+    for key in dict.fromkeys((row["metrics_view"], row["kind"]) for row in rows):
+        latencies = [row["seconds"] for row in rows if (row["metrics_view"], row["kind"]) == key]
+        summary[" ".join(key)] = {
+            "queries": len({row["query"] for row in rows if (row["metrics_view"], row["kind"]) == key}),
+            "runs": len(latencies),
+            # The median, compared against a baseline
+            "seconds": percentile(latencies, 50),
+            **{f"p{p}_seconds": percentile(latencies, p) for p in PERCENTILES},
+            "max_seconds": max(latencies),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the dashboard queries of a project generated by generate_project.py",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark_dashboard.py duckdb/duckdb
+  python benchmark_dashboard.py duckdb/duckdb rilldata/rill --project-dir ../github-project --repeat 10
+  python benchmark_dashboard.py duckdb/duckdb --baseline benchmarks/dashboard-baseline.json --max-regression 10
+        """
+    )
+    parser.add_argument(
+        "repo_slugs",
+        nargs="+",
+        metavar="repo_slug",
+        help="GitHub repositories the project was generated for, in format 'owner/repo'"
+    )
+    parser.add_argument("--name", help="File prefix the project was generated with (default: as in generate_project.py)")
+    parser.add_argument("--project-dir", default=".", help="Directory of the generated project and its data/ directory (default: .)")
+    parser.add_argument("--database", default=":memory:", help="DuckDB database file to materialize into (default: in memory)")
+    parser.add_argument("--threads", type=int, help="DuckDB threads (default: DuckDB's default)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs of each query, after a warm-up run (default: 5)")
+    parser.add_argument("--top-n", type=int, default=10, help="Rows of each leaderboard (default: 10)")
+    parser.add_argument("--output", default="benchmarks/dashboard.json", help="JSON results file, a CSV is written next to it (default: benchmarks/dashboard.json)")
+    parser.add_argument("--baseline", help="Compare against the results of a previous run")
+    parser.add_argument("--max-regression", type=float, metavar="PERCENT", help="Exit with an error if a step or kind of query is this much slower than the baseline")
+    args = parser.parse_args()
+
+    name = args.name or ("github" if len(args.repo_slugs) > 1 else sanitize_name(args.repo_slugs[0]))
+    output = Path(args.output).resolve()
+    os.chdir(args.project_dir)
+
+    con = duckdb.connect(args.database)
+    if args.threads:
+        con.execute(f"SET threads = {args.threads}")
+
+    materialization = materialize_project(con, name)
+
+    rows = []
+    for path in [Path(f"metrics/{name}_commits_metrics.yaml"), Path(f"metrics/{name}_commits_daily_metrics.yaml")]:
+        if not path.exists():
+            continue
+        with open(path) as f:
+            metrics_view = yaml.safe_load(f)
+        queries = dashboard_queries(con, metrics_view, args.top_n)
+        logger.info(f"Running {len(queries)} queries of {path.stem}, {args.repeat} times each")
+        for kind, query, sql in queries:
+            for repeat, seconds in enumerate(run_query(con, sql, args.repeat)):
+                rows.append({"metrics_view": path.stem, "kind": kind, "query": query, "repeat": repeat, "seconds": seconds})
+
+    summary = summarize(rows, materialization)
+    results = {
+        "created_at": pd.Timestamp.now(tz="UTC").isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "duckdb": duckdb.__version__,
+            "threads": con.execute("SELECT current_setting('threads')").fetchone()[0],
+        },
+        "project": {"name": name, "repos": args.repo_slugs, "top_n": args.top_n, "repeat": args.repeat},
+        "summary": summary,
+        "runs": rows,
+    }
+    write_results(output, results)
+
+    for key, values in summary.items():
+        if key.startswith("materialize"):
+            logger.info(f"{key}: {values['seconds']:.2f}s, {values['rows']} rows")
+        else:
+            logger.info(f"{key}: {values['queries']} queries, " + ", ".join(
+                f"p{p} {values[f'p{p}_seconds'] * 1000:.1f} ms" for p in PERCENTILES) + f", max {values['max_seconds'] * 1000:.1f} ms")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["project"]["repos"] != args.repo_slugs:
+            logger.warning("The baseline was recorded for different repositories")
+        if not compare(summary, baseline["summary"], args.max_regression):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Benchmark download_commits.py against synthetic local repositories, without any network access.
+
+A git repository of the requested shape is generated with `git fast-import`, then
+download_commits() is run against it once per configuration and repeat, each run in a fresh
+process so peak memory is measured per run. The run reports are collected into a JSON and a
+CSV file that can be compared against a previous baseline.
+
+Usage:
+    python benchmark_download.py [--commits N] [--files-per-commit N] [--merge-ratio R] [--rename-rate R]
+                                 [--backend NAME ...] [--workers N ...] [--repeat N] [--output PATH]
+
+Examples:
+    # Compare both backends on a 5,000 commit history
+    python benchmark_download.py --commits 5000 --backend pydriller --backend git-log
+
+    # Record a baseline, then fail if a later run is more than 10% slower
+    python benchmark_download.py --output benchmarks/baseline.json
+    python benchmark_download.py --baseline benchmarks/baseline.json --max-regression 10
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import pandas as pd
+
+from download_commits import BACKENDS, DEFAULT_BATCH_SIZE, LAYOUTS, WriterOptions, download_commits
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+WORDS = ["fix", "add", "update", "remove", "refactor", "improve", "support", "handle", "test", "docs",
+         "parser", "writer", "query", "cache", "index", "config", "error", "build", "release", "cleanup"]
+DIRECTORIES = ["src", "docs", "tests", "scripts", "lib"]
+SUBDIRECTORIES = ["core", "api", "utils", "io", "cli"]
+EXTENSIONS = [".py", ".md", ".txt", ".json", ".yaml"]
+
+# Share of file changes that create a new file rather than modify an existing one
+NEW_FILE_RATE = 0.2
+
+# Files are trimmed back once they grow past this many lines, to keep diffs a realistic size
+MAX_FILE_LINES = 200
+
+# Commits are spaced roughly this many seconds apart, starting at 2020-01-01
+COMMIT_INTERVAL = 3600
+START_TIMESTAMP = 1577836800
+
+
+def sentence(rng, size):
+    """Random words adding up to about `size` characters."""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+class SyntheticHistory:
+    """Write a synthetic git history as a `git fast-import` stream."""
+
+    def __init__(self, stream, rng, files_per_commit, rename_rate, message_size, lines_per_change, authors):
+        self.stream = stream
+        self.rng = rng
+        self.files_per_commit = files_per_commit
+        self.rename_rate = rename_rate
+        self.message_size = message_size
+        self.lines_per_change = lines_per_change
+        self.authors = authors
+        self.files = {}
+        self.paths = []
+        self.mark = 0
+        self.counter = 0
+
+    def data(self, payload):
+        self.stream.write(b"data %d\n" % len(payload))
+        self.stream.write(payload)
+        self.stream.write(b"\n")
+
+    def new_path(self):
+        self.counter += 1
+        name = f"file{self.counter}{self.rng.choice(EXTENSIONS)}"
+        depth = self.rng.randrange(3)
+        directories = [self.rng.choice(DIRECTORIES), self.rng.choice(SUBDIRECTORIES)][:depth]
+        return "/".join(directories + [name])
+
+    def line(self):
+        self.counter += 1
+        return f"{sentence(self.rng, 30)} {self.counter}"
+
+    def change_file(self, path):
+        """Insert and delete a few lines of a file, creating it if needed."""
+        lines = self.files.setdefault(path, [])
+        for _ in range(self.lines_per_change):
+            lines.insert(self.rng.randint(0, len(lines)), self.line())
+        while len(lines) > MAX_FILE_LINES:
+            lines.pop(self.rng.randrange(len(lines)))
+
+    def file_changes(self):
+        """Pick the files changed by one commit and return the fast-import commands for them."""
+        commands = []
+        touched = set()
+        if self.paths and self.rng.random() < self.rename_rate:
+            old = self.rng.choice(self.paths)
+            new = self.new_path()
+            self.files[new] = self.files.pop(old)
+            self.paths[self.paths.index(old)] = new
+            commands.append(f"R {old} {new}\n".encode())
+            touched.add(new)
+        for _ in range(self.files_per_commit):
+            if not self.paths or self.rng.random() < NEW_FILE_RATE:
+                path = self.new_path()
+                self.paths.append(path)
+            else:
+                path = self.rng.choice(self.paths)
+            if path in touched:
+                continue
+            touched.add(path)
+            self.change_file(path)
+        for path in sorted(touched):
+            commands.append(f"M 100644 inline {path}\n".encode())
+            commands.append("\n".join(self.files[path]).encode() + b"\n")
+        return commands
+
+    def commit(self, ref, timestamp, message, parents, commands):
+        """Write one commit and return its mark."""
+        self.mark += 1
+        author = self.rng.randrange(self.authors)
+        signature = f"Author {author} <author{author}@example.com> {timestamp} +0000"
+        self.stream.write(f"commit {ref}\nmark :{self.mark}\nauthor {signature}\ncommitter {signature}\n".encode())
+        self.data(message.encode())
+        for keyword, parent in zip(["from"] + ["merge"] * len(parents), parents):
+            self.stream.write(f"{keyword} :{parent}\n".encode())
+        for command in commands:
+            if command.startswith((b"M ", b"R ")):
+                self.stream.write(command)
+            else:
+                self.data(command)
+        self.stream.write(b"\n")
+        return self.mark
+
+    def message(self, number):
+        return f"Commit {number}: {sentence(self.rng, 40)}\n\n{sentence(self.rng, self.message_size)}\n"
+
+
+def generate_repository(path, commits=1000, files_per_commit=5, merge_ratio=0.05, rename_rate=0.02, message_size=200, lines_per_change=5, authors=20, seed=0):
+    """Create a bare git repository at `path` with a synthetic history of the given shape.
+
+    `commits` is the number of commits on main. Each merge commit brings in one extra commit from a
+    side branch, so the repository contains about commits * (1 + merge_ratio) commits in total.
+    """
+    subprocess.run(["git", "init", "--quiet", "--bare", str(path)], check=True)
+    process = subprocess.Popen(["git", "-C", str(path), "fast-import", "--quiet", "--done"], stdin=subprocess.PIPE)
+    rng = random.Random(seed)
+    history = SyntheticHistory(process.stdin, rng, files_per_commit, rename_rate, message_size, lines_per_change, authors)
+    tip = None
+    for number in range(commits):
+        timestamp = START_TIMESTAMP + number * COMMIT_INTERVAL + rng.randrange(COMMIT_INTERVAL // 2)
+        parents = [tip] if tip else []
+        if tip and rng.random() < merge_ratio:
+            # Branch off main, then merge the side commit back with its changes applied on top of main
+            commands = history.file_changes()
+            side = history.commit("refs/heads/side", timestamp, history.message(number), parents, commands)
+            tip = history.commit("refs/heads/main", timestamp, "Merge branch 'side'\n", parents + [side], commands)
+        else:
+            tip = history.commit("refs/heads/main", timestamp, history.message(number), parents, history.file_changes())
+    process.stdin.write(b"done\n")
+    process.stdin.close()
+    if process.wait():
+        raise RuntimeError(f"git fast-import failed with exit code {process.returncode}")
+    subprocess.run(["git", "-C", str(path), "symbolic-ref", "HEAD", "refs/heads/main"], check=True)
+    logger.info(f"Generated {history.mark} commits in {path}")
+
+
+def run_download(repo_path, workdir, options, verbose=False):
+    """Run download_commits() from `workdir` and return its run report. Meant to run in a fresh process."""
+    if not verbose:
+        logging.getLogger("download_commits").setLevel(logging.WARNING)
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    writer_options = WriterOptions(batch_size=options["batch_size"], layout=options["layout"])
+    return download_commits(
+        str(repo_path), "benchmark/synthetic", "synthetic", use_local=True, backend=options["backend"], workers=options["workers"],
+        pipeline=options["pipeline"], writer_options=writer_options,
+    )
+
+
+def result_row(shape, options, repeat, report):
+    """Flatten a run report into one row of the results."""
+    row = {**{f"shape_{key}": value for key, value in shape.items()}, **options, "repeat": repeat}
+    for key in ["seconds", "commits", "file_changes", "commits_per_second", "file_changes_per_second",
+                "bytes_written", "peak_rss_bytes", "peak_rss_children_bytes"]:
+        row[key] = report[key]
+    for stage, seconds in report["stages"].items():
+        row[f"{stage}_seconds"] = seconds
+    for table, details in report["tables"].items():
+        for stage, seconds in details["seconds"].items():
+            row[f"{table}_{stage}_seconds"] = seconds
+    return row
+
+
+def config_key(row):
+    return (f"backend={row['backend']} workers={row['workers']} layout={row['layout']} "
+            f"batch_size={row['batch_size']} pipeline={row['pipeline']}")
+
+
+def summarize(rows):
+    """Median time and throughput, and maximum peak memory, of the repeats of each configuration."""
+    summary = {}
+    for key in dict.fromkeys(config_key(row) for row in rows):
+        runs = [row for row in rows if config_key(row) == key]
+        summary[key] = {
+            "runs": len(runs),
+            "seconds": statistics.median(row["seconds"] for row in runs),
+            "commits_per_second": statistics.median(row["commits_per_second"] for row in runs),
+            "file_changes_per_second": statistics.median(row["file_changes_per_second"] for row in runs),
+            "peak_rss_bytes": max(row["peak_rss_bytes"] for row in runs),
+            "peak_rss_children_bytes": max(row["peak_rss_children_bytes"] for row in runs),
+        }
+    return summary
+
+
+def write_results(path, results):
+    """Write the results as JSON, and the individual runs as CSV next to it."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    columns = list(dict.fromkeys(column for row in results["runs"] for column in row))
+    with open(path.with_suffix(".csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(results["runs"])
+    logger.info(f"Wrote results to {path} and {path.with_suffix('.csv')}")
+
+
+def compare(summary, baseline, max_regression=None):
+    """Log the change against a baseline summary. Returns False if a configuration regressed too much."""
+    passed = True
+    for key, current in summary.items():
+        previous = baseline.get(key)
+        if not previous:
+            logger.info(f"{key}: no baseline")
+            continue
+        change = (current["seconds"] - previous["seconds"]) / previous["seconds"] * 100
+        logger.info(f"{key}: {current['seconds']:.2f}s vs {previous['seconds']:.2f}s baseline ({change:+.1f}%)")
+        if max_regression is not None and change > max_regression:
+            logger.error(f"{key} is {change:.1f}% slower than the baseline, more than {max_regression}%")
+            passed = False
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark download_commits.py against synthetic local repositories",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark_download.py --commits 5000 --backend pydriller --backend git-log
+  python benchmark_download.py --workers 1 --workers 4 --repeat 5
+  python benchmark_download.py --baseline benchmarks/baseline.json --max-regression 10
+        """
+    )
+    shape = parser.add_argument_group("repository shape")
+    shape.add_argument("--commits", type=int, default=1000, help="Number of commits on the main branch (default: 1000)")
+    shape.add_argument("--files-per-commit", type=int, default=5, help="Files changed by each commit (default: 5)")
+    shape.add_argument("--merge-ratio", type=float, default=0.05, help="Share of commits that merge a side branch (default: 0.05)")
+    shape.add_argument("--rename-rate", type=float, default=0.02, help="Share of commits that rename a file (default: 0.02)")
+    shape.add_argument("--message-size", type=int, default=200, help="Approximate size of commit message bodies in characters (default: 200)")
+    shape.add_argument("--lines-per-change", type=int, default=5, help="Lines added to each changed file (default: 5)")
+    shape.add_argument("--authors", type=int, default=20, help="Number of distinct authors (default: 20)")
+    shape.add_argument("--seed", type=int, default=0, help="Random seed, the same shape and seed always give the same history (default: 0)")
+
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="Backend to benchmark, can be repeated (default: all)")
+    parser.add_argument("--workers", action="append", type=int, help="Number of workers to benchmark, can be repeated (default: 1)")
+    parser.add_argument("--layout", action="append", choices=LAYOUTS, help="Output layout to benchmark, can be repeated (default: snapshot)")
+    parser.add_argument("--batch-size", action="append", type=int, help=f"Batch size to benchmark, can be repeated (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--pipeline", action="append", choices=["off", "on"], help="Run without and/or with --pipeline, can be repeated (default: off)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration, the median is reported (default: 3)")
+    parser.add_argument("--repo-dir", help="Keep generated repositories in this directory and reuse them across invocations")
+    parser.add_argument("--output", default="benchmarks/results.json", help="JSON results file, a CSV is written next to it (default: benchmarks/results.json)")
+    parser.add_argument("--baseline", help="Compare against the results of a previous run")
+    parser.add_argument("--max-regression", type=float, metavar="PERCENT", help="Exit with an error if a configuration is this much slower than the baseline")
+    parser.add_argument("--verbose", action="store_true", help="Show the log output of download_commits.py")
+    args = parser.parse_args()
+
+    shape = {
+        "commits": args.commits,
+        "files_per_commit": args.files_per_commit,
+        "merge_ratio": args.merge_ratio,
+        "rename_rate": args.rename_rate,
+        "message_size": args.message_size,
+        "lines_per_change": args.lines_per_change,
+        "authors": args.authors,
+        "seed": args.seed,
+    }
+    configurations = [
+        {"backend": backend, "workers": workers, "layout": layout, "batch_size": batch_size, "pipeline": pipeline == "on"}
+        for backend in args.backend or list(BACKENDS)
+        for workers in args.workers or [1]
+        for layout in args.layout or ["snapshot"]
+        for batch_size in args.batch_size or [DEFAULT_BATCH_SIZE]
+        for pipeline in args.pipeline or ["off"]
+    ]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        repo_dir = Path(args.repo_dir or temp_dir).resolve()
+        repo_path = repo_dir / ("synthetic-" + "-".join(str(value) for value in shape.values()) + ".git")
+        if repo_path.exists():
+            logger.info(f"Reusing {repo_path}")
+        else:
+            repo_dir.mkdir(parents=True, exist_ok=True)
+            generate_repository(repo_path, **shape)
+
+        rows = []
+        for options in configurations:
+            for repeat in range(args.repeat):
+                workdir = Path(temp_dir) / "runs" / f"{len(rows)}"
+                # A fresh process per run, so peak RSS isn't carried over from earlier runs
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    report = executor.submit(run_download, repo_path, workdir, options, args.verbose).result()
+                rows.append(result_row(shape, options, repeat, report))
+                logger.info(f"{config_key(options)} run {repeat + 1}/{args.repeat}: {report['seconds']:.2f}s, "
+                            f"{report['commits_per_second']:.0f} commits/s, peak RSS {report['peak_rss_bytes'] / 2**20:.0f} MB")
+
+    summary = summarize(rows)
+    results = {
+        "created_at": pd.Timestamp.now(tz="UTC").isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "git": subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip(),
+        },
+        "shape": shape,
+        "summary": summary,
+        "runs": rows,
+    }
+    write_results(args.output, results)
+
+    for key, values in summary.items():
+        logger.info(f"{key}: {values['seconds']:.2f}s, {values['commits_per_second']:.0f} commits/s, "
+                    f"{values['file_changes_per_second']:.0f} file changes/s, peak RSS {values['peak_rss_bytes'] / 2**20:.0f} MB")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["shape"] != shape:
+            logger.warning("The baseline was recorded on a repository of a different shape")
+        if not compare(summary, baseline["summary"], args.max_regression):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
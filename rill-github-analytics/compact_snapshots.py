@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Compact the parquet files written by download_commits.py.
+
+Every full run adds another timestamped snapshot and every incremental run adds another delta,
+so the sources end up scanning (and double counting) files that have been superseded. This
+script merges the current files of each table - the base snapshot and its deltas, as listed in
+the manifest - into a single file with one row per commit (commits) or per commit and path
+(modified files), keeping the newest copy of any duplicated row. With --layout hive, each
+partition is compacted on its own.
+
+Superseded files, including snapshots that a later full run replaced, are moved under
+`_superseded/`, which none of the source globs match, and the manifest is updated to list only
+the compacted files. Superseded files are then pruned according to --keep and --keep-days.
+Files the manifest doesn't list, as current or as superseded, are never moved: they are left in
+place with a warning.
+
+Compacted files are written under `_staging/` first, and every move is recorded in the manifest
+before it is made, so running the script again after an interruption finishes the moves instead of
+compacting the files twice.
+
+Usage:
+    python compact_snapshots.py owner/repo --gcs --bucket gs://bucket/path [--keep N] [--keep-days N]
+    python compact_snapshots.py owner/repo --local [--layout hive]
+
+Examples:
+    # Compact the local files, deleting the superseded ones straight away
+    python compact_snapshots.py rilldata/rill --local --keep 0
+
+    # Compact a bucket, keeping the last 3 sets of superseded files around for a week
+    python compact_snapshots.py duckdb/duckdb --gcs --bucket gs://my-bucket/github-analytics --keep 3 --keep-days 7
+"""
+
+import argparse
+import logging
+import re
+from datetime import datetime
+
+import fsspec
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from fsspec.implementations.local import LocalFileSystem
+
+from download_commits import (
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_ROW_GROUP_SIZE,
+    BLOOM_FILTER_COLUMNS,
+    LAYOUTS,
+    SORT_KEYS,
+    BufferedParquetWriter,
+    configure_gcs_credentials,
+    configure_s3,
+    list_files,
+    next_timestamp,
+    output_location,
+    read_last_commit,
+    sanitize_name,
+    table_glob,
+    table_target,
+    write_manifest,
+)
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger(__name__)
+
+# Columns identifying a row of each table; a modified file's path is its new path, or its old one if it was deleted
+KEY_COLUMNS = {
+    "commits": ["commit_hash"],
+    "modified_files": ["commit_hash", "new_path", "old_path"],
+}
+
+
+def normalize(path):
+    """Protocol-less absolute path, so paths from listings and manifests can be compared."""
+    return fsspec.core.url_to_fs(path)[1]
+
+
+def row_keys(table, columns):
+    """The key of every row of a table, as a table of plain string columns."""
+    if table == "commits":
+        return pa.table({"commit_hash": columns["commit_hash"]})
+    return pa.table({
+        "commit_hash": columns["commit_hash"],
+        "path": pc.coalesce(columns["new_path"].cast(pa.string()), columns["old_path"].cast(pa.string())),
+    })
+
+
+def latest_rows(table, paths):
+    """Positions of the newest copy of every row across files ordered oldest first.
+
+    A position packs the file index in the upper 32 bits and the row index in the lower ones.
+    Only the key columns are read, so memory use stays well below that of the files themselves.
+    """
+    keys = []
+    for index, path in enumerate(paths):
+        with fsspec.open(path, "rb") as f:
+            columns = pq.read_table(f, columns=KEY_COLUMNS[table])
+        file_keys = row_keys(table, columns)
+        positions = (np.int64(index) << 32) + np.arange(file_keys.num_rows, dtype=np.int64)
+        keys.append(file_keys.append_column("position", pa.array(positions)))
+    key_table = pa.concat_tables(keys)
+    latest = key_table.group_by(key_table.column_names[:-1]).aggregate([("position", "max")])
+    positions = latest["position_max"].to_numpy()
+    return key_table.num_rows, {index: np.sort(positions[positions >> 32 == index] & 0xFFFFFFFF) for index in range(len(paths))}
+
+
+def compact_files(table, paths, destination, row_group_size=DEFAULT_ROW_GROUP_SIZE, compression_level=DEFAULT_COMPRESSION_LEVEL, sort=False, bloom_filter=False):
+    """Merge files ordered oldest first into one file without duplicate rows. Returns (rows read, rows written)."""
+    rows_read, keep = latest_rows(table, paths)
+
+    # The newest file decides the schema; its metadata describes the history filters the files share
+    with fsspec.open(paths[-1], "rb") as f:
+        schema = pq.ParquetFile(f).schema_arrow
+    metadata = dict(schema.metadata or {})
+    metadata[b"compacted_from"] = str(len(paths)).encode()
+    schema = schema.with_metadata(metadata)
+
+    writer = BufferedParquetWriter(
+        destination, schema, row_group_size=row_group_size, compression_level=compression_level,
+        sort_by=SORT_KEYS[table] if sort else None, bloom_filters=BLOOM_FILTER_COLUMNS if bloom_filter else None
+    )
+    for index, path in enumerate(paths):
+        offset = 0
+        with fsspec.open(path, "rb") as f:
+            for batch in pq.ParquetFile(f).iter_batches():
+                # The rows to keep are sorted, so those of this batch are one slice of them
+                start, end = np.searchsorted(keep[index], [offset, offset + batch.num_rows])
+                rows = keep[index][start:end] - offset
+                offset += batch.num_rows
+                if len(rows) < batch.num_rows:
+                    batch = batch.take(pa.array(rows))
+                if batch.num_rows:
+                    writer.append_batch(batch.cast(schema))
+    writer.close()
+    return rows_read, writer.rows_written
+
+
+def move(path, destination):
+    """Move a file, creating the destination directory when it is local."""
+    fs, fs_path = fsspec.core.url_to_fs(path)
+    fs_destination = normalize(destination)
+    if isinstance(fs, LocalFileSystem):
+        fs.makedirs(fs._parent(fs_destination), exist_ok=True)
+    fs.mv(fs_path, fs_destination)
+
+
+def remove_directory(path):
+    fs, fs_path = fsspec.core.url_to_fs(path)
+    if fs.exists(fs_path):
+        fs.rm(fs_path, recursive=True)
+
+
+def apply_moves(directory, prefix, manifest):
+    """Make the moves recorded in the manifest, then drop them from it.
+
+    Moves an interrupted run already made are skipped, so this can be run again until it completes.
+    """
+    for path, destination in manifest.pop("pending_moves", []):
+        fs, fs_path = fsspec.core.url_to_fs(path)
+        if fs.exists(fs_path):
+            move(path, destination)
+    write_manifest(directory, prefix, manifest)
+
+
+def prune_superseded(directory, prefix, keep=1, keep_days=None):
+    """Delete the sets of superseded files beyond the newest `keep`, unless they are younger than `keep_days`."""
+    fs, fs_path = fsspec.core.url_to_fs(f"{directory}/_superseded")
+    if not fs.exists(fs_path):
+        return []
+    pattern = re.compile(rf"^{re.escape(prefix)}(\d{{14}})$")
+    generations = sorted(
+        (match.group(1), path)
+        for path in fs.ls(fs_path, detail=False)
+        if (match := pattern.match(path.rstrip("/").split("/")[-1]))
+    )
+    now = datetime.now()
+    pruned = []
+    for position, (timestamp, path) in enumerate(reversed(generations)):
+        age_days = (now - datetime.strptime(timestamp, "%Y%m%d%H%M%S")).total_seconds() / 86400
+        if position < keep or (keep_days is not None and age_days < keep_days):
+            continue
+        fs.rm(path, recursive=True)
+        pruned.append(path)
+    if pruned:
+        logger.info(f"Pruned {len(pruned)} sets of superseded files")
+    return pruned
+
+
+def compact(repo_slug, use_local=True, bucket=None, layout="snapshot", keep=1, keep_days=None, row_group_size=DEFAULT_ROW_GROUP_SIZE, compression_level=DEFAULT_COMPRESSION_LEVEL, sort=False, bloom_filter=False):
+    """Compact the files of both tables of a repository and prune superseded files. Returns a summary per table."""
+    repo_name = sanitize_name(repo_slug)
+    directory, prefix = output_location(use_local, repo_name, bucket, repo_slug)
+    globs = {table: table_glob(table, use_local, repo_name, bucket, repo_slug, layout) for table in KEY_COLUMNS}
+    staging = f"{directory}/_staging/{prefix}compact"
+
+    # Without a manifest every file counts as current, so all of them are merged
+    manifest = read_last_commit(directory, prefix, globs["commits"], globs["modified_files"])
+    if not manifest:
+        logger.info(f"Nothing to compact for {repo_slug}")
+        return {}
+    if manifest.get("pending_moves"):
+        logger.info("Finishing the moves of an interrupted compaction")
+        apply_moves(directory, prefix, manifest)
+    # Compacted files a run was interrupted before recording are written again
+    remove_directory(staging)
+    manifest.setdefault("repo_slug", repo_slug)
+    listed = {table: list_files(pattern) for table, pattern in globs.items()}
+    current = {normalize(path): path for paths in manifest["files"].values() for path in paths}
+    replaced = {normalize(path) for paths in (manifest.get("superseded") or {}).values() for path in paths}
+
+    # Compacted files must sort after, and never overwrite, the files they replace
+    timestamp = next_timestamp([path for paths in listed.values() for path in paths])
+    archive = f"{directory}/_superseded/{prefix}{timestamp}"
+
+    # Compacted and superseded files keep their path relative to the output root under the staging
+    # and archive directories
+    root = normalize("data" if use_local else bucket) if layout == "hive" else normalize(directory)
+    summary = {}
+    files = {}
+    staged = []
+    superseded = []
+    for table in KEY_COLUMNS:
+        paths = listed[table]
+        table_superseded = [path for path in paths if normalize(path) not in current and normalize(path) in replaced]
+        live = [path for path in paths if normalize(path) in current]
+        # Files no manifest accounts for could be anyone's; they are neither merged nor moved
+        unlisted = [path for path in paths if normalize(path) not in current and normalize(path) not in replaced]
+        if unlisted:
+            logger.warning(
+                f"{table}: {len(unlisted)} files aren't listed in the manifest and were left in place: "
+                + ", ".join(unlisted[:5]) + (", ..." if len(unlisted) > 5 else "")
+            )
+
+        partitions = {}
+        for path in live:
+            partition = "/".join(path.split("/")[-3:-1]) if layout == "hive" else None
+            partitions.setdefault(partition, []).append(path)
+
+        files[table] = []
+        rows_read = rows_written = 0
+        for partition, paths in sorted(partitions.items(), key=lambda item: item[0] or ""):
+            if len(paths) == 1:
+                files[table].append(current[normalize(paths[0])])
+                continue
+            destination = table_target(table, use_local, repo_name, bucket, repo_slug, layout, timestamp)
+            if layout == "hive":
+                destination = f"{destination}/{partition}/{timestamp}.parquet"
+            staged_path = f"{staging}/{normalize(destination)[len(root) + 1:]}"
+            read, written = compact_files(table, paths, staged_path, row_group_size, compression_level, sort, bloom_filter)
+            rows_read += read
+            rows_written += written
+            files[table].append(destination)
+            staged.append((staged_path, destination))
+            table_superseded.extend(paths)
+
+        superseded.extend(table_superseded)
+        summary[table] = {
+            "files": len(files[table]),
+            "superseded_files": len(table_superseded),
+            "unlisted_files": len(unlisted),
+            "rows_read": rows_read,
+            "rows_written": rows_written,
+        }
+        logger.info(
+            f"{table}: {len(live)} current files compacted into {len(files[table])}, "
+            f"{rows_read - rows_written} duplicate rows dropped, {len(table_superseded)} files superseded"
+        )
+
+    # The manifest lists the moves before any is made, so a run interrupted while making them can finish them
+    manifest["files"] = files
+    manifest["superseded"] = {table: [] for table in KEY_COLUMNS}
+    manifest["compacted_at"] = pd.Timestamp.now(tz="UTC").isoformat()
+    manifest["pending_moves"] = staged + [(path, f"{archive}/{normalize(path)[len(root) + 1:]}") for path in superseded]
+    write_manifest(directory, prefix, manifest)
+    apply_moves(directory, prefix, manifest)
+    remove_directory(staging)
+
+    prune_superseded(directory, prefix, keep, keep_days)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compact the parquet files written by download_commits.py",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python compact_snapshots.py rilldata/rill --local
+  python compact_snapshots.py duckdb/duckdb --local --layout hive
+  python compact_snapshots.py duckdb/duckdb --gcs --bucket gs://my-bucket/github-analytics --keep 3 --keep-days 7
+        """
+    )
+    parser.add_argument("repo_slug", help="GitHub repository in format 'owner/repo' (e.g., 'rilldata/rill')")
+    parser.add_argument("--local", action="store_true", help="Compact the local data/ directory")
+    parser.add_argument("--gcs", action="store_true", help="Compact files in Google Cloud Storage")
+    parser.add_argument("--s3", action="store_true", help="Compact files in Amazon S3 or an S3-compatible store")
+    parser.add_argument("--bucket", help="Cloud storage bucket path the data was downloaded to (required with --gcs or --s3)")
+    parser.add_argument("--gcs-key-file", help="Path to GCS service account key file (optional if GOOGLE_APPLICATION_CREDENTIALS is set)")
+    parser.add_argument("--s3-endpoint-url", help="Endpoint of an S3-compatible store (default: AWS)")
+    parser.add_argument("--layout", choices=LAYOUTS, default="snapshot", help="Layout the data was written with (default: snapshot)")
+    parser.add_argument("--keep", type=int, default=1, help="Keep the newest N sets of superseded files, 0 to delete them straight away (default: 1)")
+    parser.add_argument("--keep-days", type=float, help="Also keep superseded files that were superseded less than N days ago")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE, help=f"Rows per parquet row group (default: {DEFAULT_ROW_GROUP_SIZE})")
+    parser.add_argument("--compression", type=int, default=DEFAULT_COMPRESSION_LEVEL, metavar="LEVEL", help=f"zstd compression level (default: {DEFAULT_COMPRESSION_LEVEL})")
+    parser.add_argument("--sort", action="store_true", help="Sort the compacted files like download_commits.py --sort")
+    parser.add_argument("--bloom-filter", action="store_true", help="Write bloom filters on commit_hash, like download_commits.py --bloom-filter")
+    args = parser.parse_args()
+
+    storage_flags = sum([args.local, args.gcs, args.s3])
+    if storage_flags != 1:
+        logger.error("Must specify exactly one storage location: --local, --gcs, or --s3")
+        return 1
+    if (args.gcs or args.s3) and not args.bucket:
+        logger.error("--bucket is required when using --gcs or --s3")
+        return 1
+
+    if args.s3:
+        configure_s3(args.s3_endpoint_url)
+    elif args.gcs:
+        configure_gcs_credentials(args.gcs_key_file)
+
+    compact(args.repo_slug, args.local, args.bucket, args.layout, args.keep, args.keep_days, args.row_group_size, args.compression, args.sort, args.bloom_filter)
+    logger.info("\n✅ Compaction complete!")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -3,24 +3,63 @@
 Download GitHub commit data for a repository.
 
 Usage:
-    python download_commits.py owner/repo --gcs --bucket gs://bucket/path [--limit N]
-    python download_commits.py owner/repo --local [--limit N]
+    python download_commits.py owner/repo --gcs --bucket gs://bucket/path [--limit N] [--incremental]
+    python download_commits.py owner/repo --s3 --bucket s3://bucket/path [--limit N] [--incremental]
+    python download_commits.py owner/repo --local [--limit N] [--incremental]
+    python download_commits.py owner/repo owner/other-repo ... --local [--workers N]
 
 Examples:
     # Upload to GCS (recommended for deployment)
     python download_commits.py duckdb/duckdb --gcs --bucket gs://my-bucket/github-analytics
+
+    # Upload to S3, or an S3-compatible store such as MinIO
+    python download_commits.py duckdb/duckdb --s3 --bucket s3://my-bucket/github-analytics
+    python download_commits.py duckdb/duckdb --s3 --bucket s3://my-bucket/github-analytics --s3-endpoint-url http://localhost:9000
     
     # Save locally (for testing)
     python download_commits.py rilldata/rill --local --limit 1000
+    python download_commits.py rilldata/rill --local --since 2024-01-01
+
+    # Only download commits added since the last run
+    python download_commits.py duckdb/duckdb --gcs --bucket gs://my-bucket/github-analytics --incremental
+
+    # Download several repositories into one dataset, three at a time
+    python download_commits.py duckdb/duckdb rilldata/rill clickhouse/clickhouse --local --workers 3
 """
 
 import argparse
+import cProfile
+import inspect
+import io
+import json
 import logging
+import multiprocessing
 import os
-from pathlib import Path
+import queue
+import re
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path, PurePosixPath
 
+import fsspec
 import pandas as pd
-from pydriller import Repository
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from fsspec.implementations.local import LocalFileSystem
+from git import NULL_TREE, Repo
+from pydriller import Git, ModificationType, ModifiedFile
+
+from schema import COMMITS_COLUMNS, LINE_COLUMNS, MODIFIED_FILES_COLUMNS, resolve_columns
 
 # Configure logging
 logging.basicConfig(
@@ -36,91 +75,1573 @@ def sanitize_name(repo_slug):
     return repo_slug.split("/")[-1].replace("-", "_").lower()
 
 
-def write_to_local(df, filename, repo_name):
-    """Write dataframe to local parquet file."""
-    data_dir = Path("data")
-    data_dir.mkdir(exist_ok=True)
-    
-    TIMESTAMP = pd.Timestamp.now().strftime("%Y%m%d%H%M%S")
-    filepath = data_dir / f"{repo_name}_{filename}_{TIMESTAMP}.parquet"
-    df.to_parquet(filepath)
-    logger.info(f"Wrote {len(df)} rows to {filepath}")
-    return filepath
+# Traversal backends: full pydriller diffs, or a single streaming `git log --raw --numstat` pass
+BACKENDS = ("pydriller", "git-log")
+
+# Bytes read from `git log` at a time by the git-log backend
+GIT_LOG_READ_SIZE = 1 << 20
+
+# Number of consecutive commits handed to a worker process at a time with --workers
+COMMITS_PER_SHARD = 200
+
+# Output layouts: one timestamped file per table and run, or hive partitions by repo, year and month
+LAYOUTS = ("snapshot", "hive")
+
+# Partition files kept open at once by the hive layout
+MAX_OPEN_PARTITIONS = 16
+
+# Rows buffered as Python objects before they are converted to an Arrow record batch
+DEFAULT_BATCH_SIZE = 10_000
+
+# Rows written to the parquet file per row group
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+# zstd compression level of the parquet files
+DEFAULT_COMPRESSION_LEVEL = 3
+
+# Bump whenever the columns in schema.py or their types below change, it is stored in the parquet metadata
+SCHEMA_VERSION = 2
+
+# With --sort, rows are ordered so row group statistics let readers skip by date, and join on commit_hash faster
+SORT_KEYS = {
+    "commits": [("author_date", "ascending"), ("commit_hash", "ascending")],
+    "modified_files": [("commit_hash", "ascending")],
+}
+
+# Columns that get a bloom filter with --bloom-filter
+BLOOM_FILTER_COLUMNS = ["commit_hash"]
+
+# Parquet files are uploaded to S3 in parts of this size, several parts at a time
+DEFAULT_S3_PART_SIZE = 16 * 2**20
+DEFAULT_S3_CONCURRENCY = 4
+MIN_S3_PART_SIZE = 5 * 2**20
+# Upload settings of every S3 file opened for writing, see configure_s3
+S3_UPLOAD_OPTIONS = {"part_size": DEFAULT_S3_PART_SIZE, "concurrency": DEFAULT_S3_CONCURRENCY}
+
+# Commits waiting for each writer thread in pipelined mode, before traversal blocks
+PIPELINE_QUEUE_SIZE = 1_000
+
+# Low-cardinality strings such as names and paths are dictionary encoded
+DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+# Types of the columns listed in schema.py
+COLUMN_TYPES = {
+    "commit_hash": pa.string(),
+    "commit_msg": pa.string(),
+    "author_name": DICTIONARY_STRING,
+    "author_email": DICTIONARY_STRING,
+    "author_date": pa.timestamp("us", tz="UTC"),
+    "author_timezone": pa.int32(),
+    "merge": pa.bool_(),
+    "filename": DICTIONARY_STRING,
+    "old_path": DICTIONARY_STRING,
+    "new_path": DICTIONARY_STRING,
+    "added_lines": pa.int32(),
+    "deleted_lines": pa.int32(),
+    "file_extension": DICTIONARY_STRING,
+    "first_directory": DICTIONARY_STRING,
+    "second_directory": DICTIONARY_STRING,
+    "second_directory_concat": DICTIONARY_STRING,
+}
+
+COMMITS_SCHEMA = pa.schema([(name, COLUMN_TYPES[name]) for name in COMMITS_COLUMNS])
+MODIFIED_FILES_SCHEMA = pa.schema([(name, COLUMN_TYPES[name]) for name in MODIFIED_FILES_COLUMNS])
+
+
+def project_schema(schema, columns, metadata=None):
+    """The schema with only `columns` and the given metadata, or None for a table that isn't extracted."""
+    return pa.schema([schema.field(name) for name in columns], metadata=metadata) if columns else None
+
+
+def map_dictionary(column, function):
+    """Apply a function to the distinct values of a dictionary column only, and expand the result to every row."""
+    return function(column.dictionary).take(column.indices)
+
+
+def extract_group(values, pattern):
+    """Return the first capture group of `pattern`, or null where it doesn't match."""
+    return pc.struct_field(pc.extract_regex(values, pattern), [0])
+
+
+def file_extension(filenames):
+    """The extension including its dot, or an empty string if the filename has none."""
+    return pc.replace_substring_regex(filenames, r"^(?:[^.]*|.*(\.[^.]*))$", r"\1")
+
+
+def directories(paths):
+    """The first directory, second directory and both joined, or null for paths that aren't nested that deep."""
+    first = extract_group(paths, r"^(?P<first>[^/]*)/")
+    second = extract_group(paths, r"^[^/]*/(?P<second>[^/]*)/")
+    concat = pc.coalesce(extract_group(paths, r"^(?P<concat>[^/]*/[^/]*)/"), first)
+    return pa.StructArray.from_arrays([first, second, concat], ["first", "second", "concat"])
+
+
+def add_path_columns(batch):
+    """Fill in the derived path columns of a modified files batch, those in its schema only."""
+    names = batch.schema.names
+    columns = {}
+    if "file_extension" in names:
+        columns["file_extension"] = map_dictionary(batch.column("filename"), file_extension).dictionary_encode()
+    if {"first_directory", "second_directory", "second_directory_concat"} & set(names):
+        paths = map_dictionary(batch.column("new_path"), directories)
+        for i, name in enumerate(["first_directory", "second_directory", "second_directory_concat"]):
+            if name in names:
+                columns[name] = pc.struct_field(paths, [i]).dictionary_encode()
+    arrays = [columns.get(field.name, batch.column(field.name)) for field in batch.schema]
+    return pa.RecordBatch.from_arrays(arrays, schema=batch.schema)
+
+
+class BufferedParquetWriter:
+    """Stream rows into a single zstd-compressed parquet file.
+
+    Every `batch_size` rows are converted to an Arrow record batch, and every `row_group_size`
+    rows are appended to the file as a row group. The file is only created once the first row
+    group is written, so a run that produces no rows writes nothing. `derive`, if given, is called
+    on every record batch to fill in computed columns.
+
+    With `sort_by`, every row is buffered until close() and the file is written in that order, with
+    a page index and its sorting columns recorded. `bloom_filters` lists columns to write bloom
+    filters for.
+    """
+
+    def __init__(self, path, schema, batch_size=DEFAULT_BATCH_SIZE, row_group_size=DEFAULT_ROW_GROUP_SIZE, compression_level=DEFAULT_COMPRESSION_LEVEL, derive=None, sort_by=None, bloom_filters=None):
+        self.path = path
+        self.schema = schema
+        self.batch_size = batch_size
+        self.row_group_size = row_group_size
+        self.compression_level = compression_level
+        self.derive = derive
+        self.sort_by = sort_by
+        self.bloom_filters = bloom_filters
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.timings = {"convert": 0.0, "encode": 0.0, "finalize": 0.0}
+        self.paths = []
+        self._rows = []
+        self._batches = []
+        self._batched_rows = 0
+        self._file = None
+        self._writer = None
+
+    def append(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self._convert()
+            if self._batched_rows >= self.row_group_size and not self.sort_by:
+                self.flush(complete_groups=True)
+
+    def append_batch(self, batch):
+        """Append an Arrow record batch that already matches the schema."""
+        self._convert()
+        self._batches.append(batch)
+        self._batched_rows += batch.num_rows
+        if self._batched_rows >= self.row_group_size and not self.sort_by:
+            self.flush(complete_groups=True)
+
+    def _convert(self):
+        if self._rows:
+            started = time.perf_counter()
+            batch = pa.RecordBatch.from_pylist(self._rows, schema=self.schema)
+            self._batches.append(self.derive(batch) if self.derive else batch)
+            self._batched_rows += len(self._rows)
+            self._rows = []
+            self.timings["convert"] += time.perf_counter() - started
+
+    def flush(self, complete_groups=False):
+        """Write the buffered rows. With `complete_groups`, a partial last row group stays buffered."""
+        self._convert()
+        table = pa.Table.from_batches(self._batches, schema=self.schema)
+        if self.sort_by:
+            # Only close() flushes a sorted writer, so this orders the whole file
+            table = table.sort_by(self.sort_by)
+        rows = table.num_rows - table.num_rows % self.row_group_size if complete_groups else table.num_rows
+        if not rows:
+            return
+        started = time.perf_counter()
+        if self._writer is None:
+            options = {}
+            if self.sort_by:
+                options["sorting_columns"] = pq.SortingColumn.from_ordering(self.schema, self.sort_by)
+                options["write_page_index"] = True
+            if self.bloom_filters:
+                # Size the filters for one row group of distinct values
+                options["bloom_filter_options"] = {column: {"ndv": min(rows, self.row_group_size)} for column in self.bloom_filters}
+            self._file = open_output(self.path)
+            self._writer = pq.ParquetWriter(self._file, self.schema, compression="zstd", compression_level=self.compression_level, **options)
+        self._writer.write_table(table.slice(0, rows), row_group_size=self.row_group_size)
+        self.rows_written += rows
+        self._batches = table.slice(rows).to_batches()
+        self._batched_rows = table.num_rows - rows
+        self.timings["encode"] += time.perf_counter() - started
+
+    def close(self):
+        """Flush the remaining rows and finish the file. Returns its path, or None if nothing was written."""
+        self.flush()
+        if self._writer is None:
+            return None
+        started = time.perf_counter()
+        self._writer.close()
+        self.bytes_written = self._file.tell()
+        self._file.close()
+        self.timings["finalize"] += time.perf_counter() - started
+        self.paths = [self.path]
+        logger.info(f"Wrote {self.rows_written} rows to {self.path}")
+        return self.path
+
+    def abort(self):
+        """Drop the buffered rows and the partly written file, after a failure. A closed file is kept."""
+        self._rows, self._batches, self._batched_rows = [], [], 0
+        if self._file is None or self.paths:
+            return
+        file, self._file, self._writer = self._file, None, None
+        if isinstance(file, S3MultipartUpload):
+            file.abort()
+            return
+        # Elsewhere the file can't be abandoned half written, so it is removed once closed
+        file.close()
+        fs, fs_path = fsspec.core.url_to_fs(self.path)
+        if fs.exists(fs_path):
+            fs.rm(fs_path)
+
+
+class S3MultipartUpload(io.RawIOBase):
+    """Writable file that streams to S3 as a multipart upload, with several parts uploading at once.
+
+    At most `concurrency + 1` parts are held in memory, however large the file gets. Files smaller
+    than one part are uploaded with a single request when they are closed.
+    """
+
+    def __init__(self, fs, path, part_size=DEFAULT_S3_PART_SIZE, concurrency=DEFAULT_S3_CONCURRENCY):
+        super().__init__()
+        self.fs = fs
+        self.path = path
+        self.bucket, self.key, _ = fs.split_path(path)
+        self.part_size = part_size
+        self.position = 0
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix="s3-upload")
+        self._slots = threading.BoundedSemaphore(concurrency)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        self._buffer += data
+        self.position += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def _upload_part(self, body):
+        for part in self._parts:
+            if part.done() and part.exception():
+                raise part.exception()
+        if self._upload_id is None:
+            response = self.fs.call_s3("create_multipart_upload", Bucket=self.bucket, Key=self.key)
+            self._upload_id = response["UploadId"]
+        # Wait for a free slot, so a slow upload holds back the writer instead of filling up memory
+        self._slots.acquire()
+        self._parts.append(self._executor.submit(self._send_part, len(self._parts) + 1, body))
+
+    def _send_part(self, number, body):
+        try:
+            response = self.fs.call_s3(
+                "upload_part", Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number, Body=body
+            )
+            return {"PartNumber": number, "ETag": response["ETag"]}
+        finally:
+            self._slots.release()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self.fs.call_s3("put_object", Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                parts = [part.result() for part in self._parts]
+                self.fs.call_s3(
+                    "complete_multipart_upload", Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self._executor.shutdown()
+            self._buffer = bytearray()
+            super().close()
+        self.fs.invalidate_cache(self.path)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Never complete an upload that was interrupted
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def __del__(self):
+        # io.IOBase would close, and so complete, an upload that was never finished
+        self.abort()
+
+    def abort(self):
+        """Drop the parts uploaded so far, so they don't linger in the bucket."""
+        if self.closed:
+            return
+        try:
+            # Let the parts in flight finish, so none is uploaded after the abort
+            self._executor.shutdown(cancel_futures=True)
+            if self._upload_id is not None:
+                self.fs.call_s3("abort_multipart_upload", Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        finally:
+            self._buffer = bytearray()
+            super().close()
+
+
+def open_output(path):
+    """Open a file for streaming writes. On S3 the file is uploaded in concurrent multipart chunks."""
+    fs, fs_path = fsspec.core.url_to_fs(path)
+    if isinstance(fs, LocalFileSystem):
+        fs.makedirs(fs._parent(fs_path), exist_ok=True)
+    if "s3" in fs.protocol:
+        return S3MultipartUpload(fs, fs_path, S3_UPLOAD_OPTIONS["part_size"], S3_UPLOAD_OPTIONS["concurrency"])
+    return fs.open(fs_path, "wb")
+
+
+class PartitionedParquetWriter:
+    """Stream rows into a hive-partitioned directory, with one BufferedParquetWriter per partition.
+
+    History is traversed roughly in date order, so only the most recently used partitions are kept
+    open. A partition that is revisited after being closed gets an additional part file.
+    """
+
+    def __init__(self, root, name, schema, batch_size=DEFAULT_BATCH_SIZE, row_group_size=DEFAULT_ROW_GROUP_SIZE, compression_level=DEFAULT_COMPRESSION_LEVEL, derive=None, sort_by=None, bloom_filters=None, max_open=MAX_OPEN_PARTITIONS):
+        self.root = root
+        self.name = name
+        self.schema = schema
+        self.batch_size = batch_size
+        self.row_group_size = row_group_size
+        self.compression_level = compression_level
+        self.derive = derive
+        self.sort_by = sort_by
+        self.bloom_filters = bloom_filters
+        self.max_open = max_open
+        self.paths = []
+        self._closed = []
+        self._open = {}
+        self._parts = {}
+
+    @property
+    def rows_written(self):
+        return sum(writer.rows_written for writer in self._closed + list(self._open.values()))
+
+    @property
+    def bytes_written(self):
+        return sum(writer.bytes_written for writer in self._closed)
+
+    @property
+    def timings(self):
+        timings = {}
+        for writer in self._closed + list(self._open.values()):
+            for stage, seconds in writer.timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+        return timings
+
+    def partition(self, key):
+        """Return the writer for a partition, given as a dict of partition column values."""
+        path = "/".join(f"{column}={value}" for column, value in key.items())
+        writer = self._open.pop(path, None)
+        if writer is None:
+            part = self._parts.get(path, 0)
+            self._parts[path] = part + 1
+            suffix = f"-{part}" if part else ""
+            writer = BufferedParquetWriter(
+                f"{self.root}/{path}/{self.name}{suffix}.parquet", self.schema, self.batch_size, self.row_group_size, self.compression_level, self.derive,
+                self.sort_by, self.bloom_filters
+            )
+            if len(self._open) >= self.max_open:
+                self._close(next(iter(self._open)))
+        # Re-insert so the dict stays ordered from least to most recently used
+        self._open[path] = writer
+        return writer
+
+    def _close(self, path):
+        writer = self._open.pop(path)
+        written = writer.close()
+        if written:
+            self.paths.append(written)
+        self._closed.append(writer)
+
+    def close(self):
+        """Close every open partition and return the paths of all files written."""
+        for path in list(self._open):
+            self._close(path)
+        return self.paths
+
+    def abort(self):
+        """Drop the open partitions after a failure, keeping the files of those already closed."""
+        while self._open:
+            self._open.popitem()[1].abort()
+
+
+class ThreadedWriter:
+    """Feed a writer from a bounded queue on its own thread, so encoding and uploads overlap with traversal.
+
+    Rows are queued in groups that share a partition key, see append_rows.
+    """
+
+    _DONE = object()
+
+    def __init__(self, writer, name, queue_size=PIPELINE_QUEUE_SIZE):
+        self.writer = writer
+        self._queue = queue.Queue(queue_size)
+        self._error = None
+        self._finished = False
+        self._aborted = False
+        self._thread = threading.Thread(target=self._run, name=f"{name}-writer", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        # rows_written, paths, bytes_written and timings come from the wrapped writer
+        return getattr(self.writer, name)
+
+    def _run(self):
+        try:
+            while (item := self._queue.get()) is not self._DONE:
+                if not self._aborted:
+                    append_rows(self.writer, *item)
+            if self._aborted:
+                self.writer.abort()
+            else:
+                self.writer.close()
+        except BaseException as error:
+            self._error = error
+            # Keep draining so traversal never blocks on a queue nobody reads anymore
+            while self._queue.get() is not self._DONE:
+                pass
+
+    def _raise(self):
+        if self._error:
+            raise RuntimeError(f"{self._thread.name} thread failed") from self._error
+
+    def append_rows(self, key, rows):
+        self._raise()
+        self._queue.put((key, rows))
+
+    def finish(self):
+        """Signal that no more rows are coming, without waiting for the writer to close."""
+        if not self._finished:
+            self._finished = True
+            self._queue.put(self._DONE)
+
+    def close(self):
+        """Wait for the queued rows to be written and the file(s) to be closed."""
+        self.finish()
+        self._thread.join()
+        self._raise()
+        return self.writer.paths
+
+    def abort(self):
+        """Drop the queued rows and abort the writer, after a failure."""
+        self._aborted = True
+        self.finish()
+        self._thread.join()
+        if self._error:
+            self.writer.abort()
+
+
+class NullWriter:
+    """Stands in for the writer of a table that isn't extracted, writing nothing."""
+
+    rows_written = 0
+    bytes_written = 0
+
+    def __init__(self):
+        self.paths = []
+        self.timings = {}
+
+    def append(self, row):
+        pass
+
+    def append_rows(self, key, rows):
+        pass
+
+    def partition(self, key):
+        return self
 
+    def close(self):
+        return self.paths
 
-def write_to_gcs(df, filename, bucket_path, repo_slug, service_account_key_file):
-    """Write dataframe to GCS bucket."""
-    # Set the environment variable for the service account key file
+    def abort(self):
+        pass
+
+
+def append_rows(writer, key, rows):
+    """Append rows to a writer, or to one of its partitions when a partition key is given."""
+    target = writer.partition(key) if key else writer
+    for row in rows:
+        target.append(row)
+
+
+def close_writers(*writers):
+    """Close writers, letting threaded writers finish their last row groups and uploads at the same time."""
+    for writer in writers:
+        if isinstance(writer, ThreadedWriter):
+            writer.finish()
+    for writer in writers:
+        writer.close()
+
+
+def abort_writers(*writers):
+    """Abort writers after a failure, so no partly written file or upload is left behind."""
+    for writer in writers:
+        try:
+            writer.abort()
+        except Exception as error:
+            logger.warning(f"Could not abort a writer: {error}")
+
+
+def partition_key(commit):
+    """Hive partition values for a commit and its modified files, by author month in UTC."""
+    author_date = commit["author_date"].astimezone(timezone.utc)
+    return {"year": author_date.year, "month": f"{author_date.month:02d}"}
+
+
+class WriterOptions:
+    """How the parquet files of each table are written, see BufferedParquetWriter.
+
+    With `sort`, tables are sorted on their SORT_KEYS, and with `bloom_filter`, bloom filters are
+    written for the BLOOM_FILTER_COLUMNS.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, layout="snapshot", row_group_size=DEFAULT_ROW_GROUP_SIZE, compression_level=DEFAULT_COMPRESSION_LEVEL, sort=False, bloom_filter=False):
+        self.batch_size = batch_size
+        self.layout = layout
+        self.row_group_size = row_group_size
+        self.compression_level = compression_level
+        self.sort = sort
+        self.bloom_filter = bloom_filter
+
+    def sort_by(self, table):
+        return SORT_KEYS[table] if self.sort else None
+
+    def bloom_filters(self):
+        return BLOOM_FILTER_COLUMNS if self.bloom_filter else None
+
+
+def open_table_writer(target, schema, options, table=None, name=None):
+    """Open a streaming writer for a table's parquet file, or with the hive layout, its partitioned directory.
+
+    `target` is a local path or an s3:// or gs:// URL, see table_target, and picks the filesystem the
+    file is written to. Partitioned directories get a file named `name` in every partition. `table`
+    selects the sort key and whether path columns are derived.
+    """
+    derive = add_path_columns if table == "modified_files" else None
+    sort_by = options.sort_by(table) if table else None
+    args = (schema, options.batch_size, options.row_group_size, options.compression_level, derive, sort_by, options.bloom_filters())
+    if options.layout == "hive":
+        return PartitionedParquetWriter(target, name, *args)
+    return BufferedParquetWriter(target, *args)
+
+
+def configure_gcs_credentials(service_account_key_file):
+    """Point the Google client libraries at a service account key file, if given."""
     if service_account_key_file and os.path.exists(service_account_key_file):
         os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = service_account_key_file
-    
+
+
+class S3Options:
+    """Endpoint of the S3-compatible store, if not AWS, and the part size and concurrency of multipart uploads."""
+
+    def __init__(self, endpoint_url=None, part_size=DEFAULT_S3_PART_SIZE, concurrency=DEFAULT_S3_CONCURRENCY):
+        self.endpoint_url = endpoint_url
+        self.part_size = part_size
+        self.concurrency = concurrency
+
+
+def configure_s3(endpoint_url=None, part_size=DEFAULT_S3_PART_SIZE, concurrency=DEFAULT_S3_CONCURRENCY):
+    """Set the S3 endpoint, if given, and the multipart upload part size and concurrency for every s3:// path."""
+    options = fsspec.config.conf.setdefault("s3", {})
+    if endpoint_url:
+        options["endpoint_url"] = endpoint_url
+    options["default_block_size"] = part_size
+    S3_UPLOAD_OPTIONS.update(part_size=part_size, concurrency=concurrency)
+
+
+def output_location(use_local, repo_name, bucket=None, repo_slug=None):
+    """Return the (directory, file prefix) that snapshots for a repository are written under."""
+    if use_local:
+        return "data", f"{repo_name}_"
+    return f"{bucket}/{repo_slug}", ""
+
+
+def table_target(table, use_local, repo_name, bucket=None, repo_slug=None, layout="snapshot", timestamp=None):
+    """Path of a table's snapshot file, or the root of its hive-partitioned directory."""
+    if layout == "hive":
+        root = "data" if use_local else bucket
+        return f"{root}/{table}/repo={repo_name}"
+    if use_local:
+        return f"data/{repo_name}_{table}_{timestamp}.parquet"
+    return f"{bucket}/{repo_slug}/{table}_{timestamp}.parquet"
+
+
+def table_glob(table, use_local, repo_name, bucket=None, repo_slug=None, layout="snapshot"):
+    """Glob matching every parquet file written for one table of a repository."""
+    root = "data" if use_local else bucket
+    if layout == "hive":
+        return f"{root}/{table}/repo={repo_name}/*/*/*.parquet"
+    if use_local:
+        return f"{root}/{repo_name}_{table}*.parquet"
+    return f"{root}/{repo_slug}/{table}*.parquet"
+
+
+def list_files(pattern):
+    """List the files matching a local or remote glob, with their protocol."""
+    fs, fs_path = fsspec.core.url_to_fs(pattern)
+    if isinstance(fs, LocalFileSystem):
+        return sorted(fs.glob(fs_path))
+    return sorted(fs.unstrip_protocol(path) for path in fs.glob(fs_path))
+
+
+def file_timestamp(path):
+    """The timestamp a parquet file was written at, from its name."""
+    match = re.search(r"(\d{14})(?:-\d+)?\.parquet$", path)
+    return datetime.strptime(match.group(1), "%Y%m%d%H%M%S") if match else datetime.min
+
+
+def next_timestamp(paths):
+    """Timestamp for new files that sorts after, and so never overwrites, any of `paths`, even ones written this second."""
+    newest = max((file_timestamp(path) for path in paths), default=datetime.min)
+    return max(datetime.now().replace(microsecond=0), newest + timedelta(seconds=1)).strftime("%Y%m%d%H%M%S")
+
+
+def read_manifest(directory, prefix):
+    """Read the ingest manifest written by a previous run, or None if there isn't one."""
+    path = f"{directory}/{prefix}manifest.json"
+    fs, fs_path = fsspec.core.url_to_fs(path)
+    if not fs.exists(fs_path):
+        return None
+    with fs.open(fs_path, "r") as f:
+        return json.load(f)
+
+
+def write_manifest(directory, prefix, manifest):
+    """Write the ingest manifest next to the parquet snapshots."""
+    path = f"{directory}/{prefix}manifest.json"
+    with fsspec.open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Updated manifest {path}")
+
+
+def peak_rss(who=resource.RUSAGE_SELF):
+    """Peak resident set size in bytes, of this process or of its largest waited-for child."""
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RunStats:
+    """Wall-clock time spent in each stage of a run, and the counters reported alongside them."""
+
+    def __init__(self):
+        self.started_at = pd.Timestamp.now(tz="UTC")
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tables = {}
+        self.commits = 0
+        self.file_changes = 0
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def timed(self, name, iterable):
+        """Yield from an iterable, counting the time spent waiting for each item towards a stage."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def record_writer(self, table, writer):
+        """Add the rows, files, bytes and time of a closed writer to the totals of its table."""
+        totals = self.tables.setdefault(table, {"rows": 0, "files": 0, "bytes_written": 0, "seconds": {}})
+        totals["rows"] += writer.rows_written
+        totals["files"] += len(writer.paths)
+        totals["bytes_written"] += writer.bytes_written
+        for stage, seconds in writer.timings.items():
+            totals["seconds"][stage] = totals["seconds"].get(stage, 0.0) + seconds
+
+    def report(self, **details):
+        """The run report, with `details` describing the run merged in."""
+        seconds = self.elapsed()
+        return {
+            **details,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": pd.Timestamp.now(tz="UTC").isoformat(),
+            "seconds": seconds,
+            "stages": self.stages,
+            "commits": self.commits,
+            "file_changes": self.file_changes,
+            "commits_per_second": self.commits / seconds if seconds else 0.0,
+            "file_changes_per_second": self.file_changes / seconds if seconds else 0.0,
+            "bytes_written": sum(table["bytes_written"] for table in self.tables.values()),
+            "tables": self.tables,
+            "peak_rss_bytes": peak_rss(),
+            "peak_rss_children_bytes": peak_rss(resource.RUSAGE_CHILDREN),
+        }
+
+
+def write_run_report(directory, prefix, report):
+    """Write the JSON run report next to the parquet snapshots."""
     TIMESTAMP = pd.Timestamp.now().strftime("%Y%m%d%H%M%S")
-    filepath = f"{bucket_path}/{repo_slug}/{filename}_{TIMESTAMP}.parquet"
-    df.to_parquet(filepath)
-    logger.info(f"Wrote {len(df)} rows to {filepath}")
-    return filepath
+    path = f"{directory}/{prefix}run_{TIMESTAMP}.json"
+    with fsspec.open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote run report {path}")
+    return path
 
 
-def download_commits(repo_url, repo_slug, repo_name, use_local=True, limit=None, gcs_bucket=None, gcs_key_file=None):
-    """Download commits and modified files from a GitHub repository."""
-    commits = []
-    modified_files = []
-    
-    logger.info(f"Downloading commits from {repo_url}")
-    if limit:
-        logger.info(f"Limiting to {limit} most recent commits")
-
-    # Traverse the commits in the repository
-    count = 0
-    for commit in Repository(repo_url).traverse_commits():
-        commits.append(
-            {
-                "commit_hash": commit.hash,
-                "commit_msg": commit.msg,
-                "author_name": commit.author.name,
-                "author_email": commit.author.email,
-                "author_date": commit.author_date,
-                "author_timezone": commit.author_timezone,
-                "merge": commit.merge,
-            }
-        )
+def read_last_commit(directory, prefix, commits_glob, modified_files_glob):
+    """Find the newest commit already ingested, using the manifest or the existing commits parquet.
+
+    Without a manifest, the existing files of both tables are listed as the current ones.
+    """
+    manifest = read_manifest(directory, prefix)
+    if manifest:
+        return manifest
+
+    # No manifest yet: fall back to scanning the commits snapshots themselves
+    paths = list_files(commits_glob)
+    if not paths:
+        return None
 
-        # Iterate over the modified files in each commit
-        for modified_file in commit.modified_files:
-            modified_files.append(
-                {
-                    "commit_hash": commit.hash,
-                    "filename": modified_file.filename,
-                    "old_path": modified_file.old_path,
-                    "new_path": modified_file.new_path,
-                    "added_lines": modified_file.added_lines,
-                    "deleted_lines": modified_file.deleted_lines,
-                }
+    # author_date is stored with a fixed-offset timezone that pandas can't read back, so stay in Arrow
+    tables = []
+    for path in paths:
+        with fsspec.open(path, "rb") as f:
+            tables.append(
+                pq.read_table(f, columns=["commit_hash", "author_date"])
+                .cast(pa.schema([("commit_hash", pa.string()), ("author_date", pa.timestamp("us", tz="UTC"))]))
             )
-        
-        count += 1
-        if count % 100 == 0:
-            logger.info(f"Processed {count} commits...")
-        
-        if limit and count >= limit:
-            logger.info(f"Reached limit of {limit} commits")
+    table = pa.concat_tables(tables)
+    if table.num_rows == 0:
+        return None
+    newest = pc.index(table["author_date"], pc.max(table["author_date"])).as_py()
+    return {
+        "last_commit_hash": table["commit_hash"][newest].as_py(),
+        "last_author_date": table["author_date"][newest].as_py().isoformat(),
+        "files": {"commits": paths, "modified_files": list_files(modified_files_glob)},
+    }
+
+
+def superseded_files(manifest, replaced=False):
+    """The files a manifest lists as superseded, plus its current files if a full run `replaced` them.
+
+    Compaction only archives files a manifest lists, so the files a full run replaces are recorded here.
+    """
+    manifest = manifest or {}
+    superseded = {table: list(paths) for table, paths in (manifest.get("superseded") or {}).items()}
+    for table in ["commits", "modified_files"]:
+        superseded.setdefault(table, [])
+        if replaced:
+            superseded[table].extend(manifest.get("files", {}).get(table, []))
+    return superseded
+
+
+def merge_parquet(paths, destination, row_group_size=DEFAULT_ROW_GROUP_SIZE, compression_level=DEFAULT_COMPRESSION_LEVEL, sort_by=None, bloom_filters=None):
+    """Concatenate parquet files with the same schema into one file with full row groups, re-sorted if `sort_by` is given."""
+    writer = None
+    for path in paths:
+        with fsspec.open(path, "rb") as f:
+            parquet_file = pq.ParquetFile(f)
+            if writer is None:
+                writer = BufferedParquetWriter(
+                    destination, parquet_file.schema_arrow, row_group_size=row_group_size, compression_level=compression_level,
+                    sort_by=sort_by, bloom_filters=bloom_filters
+                )
+            for batch in parquet_file.iter_batches():
+                writer.append_batch(batch)
+    return writer.close()
+
+
+class Checkpoint:
+    """Progress of an ingest that is written in chunks of part files, so a restart can carry on after the last chunk.
+
+    The part files and the checkpoint record are staged under `staging`, which none of the source
+    globs match, and only moved into place by finalize().
+    """
+
+    def __init__(self, staging, settings):
+        self.staging = staging
+        self.path = f"{staging}/checkpoint.json"
+        self.settings = settings
+        self.state = None
+
+    def load(self):
+        """Load the checkpoint of an interrupted run with the same settings. Returns whether there was one."""
+        fs, fs_path = fsspec.core.url_to_fs(self.path)
+        if not fs.exists(fs_path):
+            return False
+        with fs.open(fs_path, "r") as f:
+            state = json.load(f)
+        if state["settings"] != self.settings:
+            logger.warning(f"Discarding checkpoint {self.path}, it was written with different settings")
+            self.discard()
+            return False
+        self.state = state
+        return True
+
+    def start(self, head_hash, rev, after_commit, timestamp):
+        self.state = {
+            "settings": self.settings,
+            "timestamp": timestamp,
+            "head_hash": head_hash,
+            "rev": rev,
+            "after_commit": after_commit,
+            "chunks": 0,
+            "commits": 0,
+            "file_changes": 0,
+            "last_commit_hash": None,
+            "parts": {"commits": [], "modified_files": []},
+        }
+
+    def part_root(self, table):
+        return f"{self.staging}/{table}"
+
+    def part_name(self):
+        return f"part-{self.state['chunks']:05d}"
+
+    def save(self, commits_writer, modified_files_writer, commits, file_changes, last_commit_hash):
+        """Record a chunk of part files once both writers are closed."""
+        self.state["parts"]["commits"].extend(commits_writer.paths)
+        self.state["parts"]["modified_files"].extend(modified_files_writer.paths)
+        self.state["chunks"] += 1
+        self.state["commits"] = commits
+        self.state["file_changes"] = file_changes
+        self.state["last_commit_hash"] = last_commit_hash
+        with fsspec.open(self.path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        logger.info(f"Checkpoint after {commits} commits ({last_commit_hash})")
+
+    def finalize(self, table, target, options):
+        """Move the part files of a table into place, merged into one file per partition. Returns the final paths."""
+        root = f"{self.part_root(table)}/"
+        partitions = {}
+        for path in self.state["parts"][table]:
+            partition = str(PurePosixPath(path[len(root):]).parent)
+            partitions.setdefault(partition, []).append(path)
+
+        final_paths = []
+        for partition, paths in partitions.items():
+            final = target if options.layout == "snapshot" else f"{target}/{partition}/{self.state['timestamp']}.parquet"
+            fs, fs_final = fsspec.core.url_to_fs(final)
+            # The file is already in place if an earlier finalize was interrupted after moving it
+            if not fs.exists(fs_final):
+                source = paths[0]
+                if len(paths) > 1:
+                    merged = f"{self.staging}/merged/{table}" + (f"/{partition}" if partition != "." else "")
+                    source = merge_parquet(
+                        paths, f"{merged}/{self.state['timestamp']}.parquet", options.row_group_size, options.compression_level,
+                        options.sort_by(table), options.bloom_filters()
+                    )
+                if isinstance(fs, LocalFileSystem):
+                    fs.makedirs(fs._parent(fs_final), exist_ok=True)
+                fs.mv(fsspec.core.url_to_fs(source)[1], fs_final)
+            final_paths.append(final)
+        return final_paths
+
+    def discard(self):
+        fs, fs_path = fsspec.core.url_to_fs(self.staging)
+        if fs.exists(fs_path):
+            fs.rm(fs_path, recursive=True)
+
+
+def mirror_path(cache_dir, repo_slug):
+    """Path of the cached bare mirror for a repository."""
+    return Path(cache_dir) / f"{repo_slug.replace('/', '__')}.git"
+
+
+def directory_size(path):
+    """Total size in bytes of the files under a directory."""
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+def update_mirror(repo_url, cache_dir, repo_slug):
+    """Clone the repository into the cache on first use, or fetch new commits into the existing mirror."""
+    path = mirror_path(cache_dir, repo_slug)
+    if path.exists():
+        logger.info(f"Fetching {repo_url} into cached mirror {path}")
+        Repo(path).git.fetch(repo_url, "+refs/heads/*:refs/heads/*", "--prune", "--force")
+    else:
+        logger.info(f"Cloning {repo_url} into cached mirror {path}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Repo.clone_from(url=repo_url, to_path=path, bare=True)
+    # The directory mtime tracks when the mirror was last used, for LRU eviction
+    os.utime(path)
+    return path
+
+
+def report_cache(cache_dir):
+    """Log the size of every cached mirror and return {path: size in bytes}."""
+    sizes = {path: directory_size(path) for path in Path(cache_dir).glob("*.git")}
+    for path, size in sorted(sizes.items()):
+        logger.info(f"  {path.name}: {size / 1e6:.1f} MB")
+    logger.info(f"Mirror cache {cache_dir}: {len(sizes)} mirrors, {sum(sizes.values()) / 1e6:.1f} MB")
+    return sizes
+
+
+def evict_mirrors(cache_dir, max_size_bytes, keep=None):
+    """Delete the least recently used mirrors until the cache fits in `max_size_bytes`."""
+    sizes = report_cache(cache_dir)
+    total = sum(sizes.values())
+    for path in sorted(sizes, key=lambda p: p.stat().st_mtime):
+        if total <= max_size_bytes:
             break
+        if keep is not None and path == Path(keep):
+            continue
+        logger.info(f"Evicting mirror {path.name} ({sizes[path] / 1e6:.1f} MB)")
+        shutil.rmtree(path)
+        total -= sizes[path]
 
-    logger.info(f"Downloaded {len(commits)} commits with {len(modified_files)} file modifications")
-    
-    # Convert to dataframes
-    commits_df = pd.DataFrame(commits)
-    modified_files_df = pd.DataFrame(modified_files)
-    
-    # Write the commits and modified files
-    if use_local:
-        write_to_local(commits_df, "commits", repo_name)
-        write_to_local(modified_files_df, "modified_files", repo_name)
+
+@contextmanager
+def open_repository(repo_url, cache_dir=None, repo_slug=None, cache_max_size=None, depth=None, shallow_since=None, branch=None):
+    """Yield a pydriller Git handle on a bare clone of the repository.
+
+    Without a cache directory the clone is temporary; with one, a mirror per repository is kept
+    there and only fetched on later runs. `cache_max_size` (in GB) bounds the cache size.
+
+    A temporary clone can be shallow: `depth` fetches only that many of the newest commits and
+    `shallow_since` only the commits after a date. One extra generation is fetched in both cases,
+    so the oldest commit that is traversed is still diffed against its parent rather than reported
+    as adding every file. Shallow clones only fetch `branch` (or the default branch).
+    """
+    if cache_dir:
+        path = update_mirror(repo_url, cache_dir, repo_slug)
+        git_repo = Git(str(path))
+        try:
+            yield git_repo
+        finally:
+            git_repo.clear()
+        if cache_max_size:
+            evict_mirrors(cache_dir, cache_max_size * 1e9, keep=path)
+        else:
+            report_cache(cache_dir)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if depth:
+            logger.info(f"Cloning the {depth} newest commits of {repo_url}")
+            Repo.clone_from(url=repo_url, to_path=tmp_dir, bare=True, depth=depth + 1, branch=branch)
+        elif shallow_since:
+            logger.info(f"Cloning commits of {repo_url} since {shallow_since}")
+            repo = Repo.clone_from(url=repo_url, to_path=tmp_dir, bare=True, shallow_since=shallow_since, branch=branch)
+            repo.git.fetch("--deepen=1")
+        else:
+            logger.info(f"Cloning {repo_url}")
+            Repo.clone_from(url=repo_url, to_path=tmp_dir, bare=True)
+        git_repo = Git(tmp_dir)
+        try:
+            yield git_repo
+        finally:
+            git_repo.clear()
+
+
+# How each column is read from a pydriller commit, only evaluated for the columns that are extracted
+COMMIT_FIELDS = {
+    "commit_hash": lambda commit: commit.hash,
+    "commit_msg": lambda commit: commit.msg,
+    "author_name": lambda commit: commit.author.name,
+    "author_email": lambda commit: commit.author.email,
+    "author_date": lambda commit: commit.author_date,
+    "author_timezone": lambda commit: commit.author_timezone,
+    "merge": lambda commit: commit.merge,
+}
+
+# How each column is read from a pydriller modified file; the derived columns are filled in by add_path_columns.
+# A diff without its patch has both paths of added and deleted files, so they're cleared by change type.
+MODIFIED_FILE_FIELDS = {
+    "filename": lambda modified_file: modified_file.filename,
+    "old_path": lambda modified_file: None if modified_file.change_type == ModificationType.ADD else modified_file.old_path,
+    "new_path": lambda modified_file: None if modified_file.change_type == ModificationType.DELETE else modified_file.new_path,
+    "added_lines": lambda modified_file: modified_file.added_lines,
+    "deleted_lines": lambda modified_file: modified_file.deleted_lines,
+}
+
+
+def commit_row(commit, columns=None):
+    """Flatten a pydriller commit into a row of the commits table, with only `columns` if given."""
+    return {name: COMMIT_FIELDS[name](commit) for name in columns or COMMIT_FIELDS}
+
+
+def diff_modified_files(git_repo, commit, pathspecs=None, patch=True):
+    """pydriller's Commit.modified_files, restricted to `pathspecs` so other files are never diffed.
+
+    Without `patch`, only the list of files is computed and not their diffs, so line counts aren't available.
+    """
+    if not pathspecs and patch:
+        return commit.modified_files
+
+    c_object = git_repo.repo.commit(commit.hash)
+    if len(c_object.parents) == 1:
+        diff_index = c_object.parents[0].diff(other=c_object, paths=pathspecs or None, create_patch=patch)
+    elif c_object.parents:
+        # pydriller doesn't report modified files for merge commits
+        diff_index = []
     else:
-        write_to_gcs(commits_df, "commits", gcs_bucket, repo_slug, gcs_key_file)
-        write_to_gcs(modified_files_df, "modified_files", gcs_bucket, repo_slug, gcs_key_file)
+        # Without the patch, files of the root commit would be reported as modified rather than added
+        diff_index = c_object.diff(NULL_TREE, paths=pathspecs or None, create_patch=True)
+    return [ModifiedFile(diff=diff) for diff in diff_index]
+
+
+def modified_file_rows(git_repo, commit, pathspecs=None, columns=None):
+    """Flatten the files touched by a pydriller commit into rows of the modified files table, with only `columns` if given.
+
+    Files are only diffed if line counts are among the columns, and not listed at all if `columns` is empty.
+    """
+    columns = list(MODIFIED_FILES_SCHEMA.names) if columns is None else columns
+    if not columns:
+        return []
+    fields = [name for name in columns if name in MODIFIED_FILE_FIELDS]
+    patch = any(name in columns for name in LINE_COLUMNS)
+    return [
+        {"commit_hash": commit.hash, **{name: MODIFIED_FILE_FIELDS[name](modified_file) for name in fields}}
+        for modified_file in diff_modified_files(git_repo, commit, pathspecs, patch)
+    ]
+
+
+# Each worker process keeps its own handle on the shared clone
+_worker_repo = None
+_worker_pathspecs = None
+_worker_columns = None
+
+
+def _init_worker(repo_path, pathspecs, columns, lock):
+    global _worker_repo, _worker_pathspecs, _worker_columns
+    # pydriller writes to the repository config when it opens it, so don't let workers race on the lock file
+    with lock:
+        _worker_repo = Git(repo_path)
+    _worker_pathspecs = pathspecs
+    _worker_columns = columns
+
+
+def _extract_shard(hashes):
+    """Extract the rows for a contiguous range of commits inside a worker process."""
+    rows = []
+    for commit_hash in hashes:
+        commit = _worker_repo.get_commit(commit_hash)
+        rows.append((
+            commit_row(commit, _worker_columns["commits"]),
+            modified_file_rows(_worker_repo, commit, _worker_pathspecs, _worker_columns["modified_files"]),
+        ))
+    return rows
+
+
+class TraversalOptions:
+    """Which commits are downloaded: at most `limit` of the newest, between `since` and `until`, reachable from `branch`.
+
+    `first_parent` and `no_merges` select how merges are followed, and `include_paths` and
+    `exclude_paths` are git pathspecs of the files whose changes are kept, see history_options.
+    """
+
+    def __init__(self, limit=None, since=None, until=None, branch=None, first_parent=False, no_merges=False, include_paths=None, exclude_paths=None):
+        self.limit = limit
+        self.since = since
+        self.until = until
+        self.branch = branch
+        self.first_parent = first_parent
+        self.no_merges = no_merges
+        self.include_paths = include_paths
+        self.exclude_paths = exclude_paths
+
+    def filters(self):
+        """The options as recorded in the parquet metadata and the manifest."""
+        return {
+            "branch": self.branch,
+            "first_parent": self.first_parent,
+            "no_merges": self.no_merges,
+            "include_paths": self.include_paths,
+            "exclude_paths": self.exclude_paths,
+            "since": self.since,
+            "until": self.until,
+            "limit": self.limit,
+        }
+
+
+def history_options(limit=None, since=None, until=None, no_merges=False, first_parent=False, pathspecs=None):
+    """Build the `git rev-list`/`git log` options that select which commits are traversed."""
+    options = {}
+    if limit:
+        options["max_count"] = limit
+    if since:
+        options["since"] = since
+    if until:
+        options["until"] = until
+    if no_merges:
+        options["no_merges"] = True
+    if first_parent:
+        options["first_parent"] = True
+    if pathspecs:
+        # Keep every commit that touches the paths instead of simplifying merged side branches away
+        options["full_history"] = True
+    return options
+
+
+def path_filters(include_paths=None, exclude_paths=None):
+    """Turn include/exclude path patterns into git pathspecs."""
+    return [*(include_paths or []), *(f":(exclude){path}" for path in exclude_paths or [])]
+
+
+def extract_commits(git_repo, rev, options, pathspecs=None, workers=1, columns=None):
+    """Yield (commit row, modified file rows) for every commit in `rev`, newest first.
+
+    `options` are passed on to `git rev-list` (see history_options), so traversal stops as soon
+    as the limit or date window is exhausted. With `pathspecs`, only commits touching those paths
+    are traversed and only the matching files are diffed. `columns` is the projection of each
+    table, see resolve_columns.
+
+    With more than one worker, the commit range is split into contiguous shards that are diffed in
+    separate processes against the same clone. Shards are consumed in order, so the output is
+    identical to a single-process run.
+    """
+    columns = columns or resolve_columns()
+    if workers <= 1:
+        for c_object in git_repo.repo.iter_commits(rev, paths=pathspecs or "", **options):
+            commit = git_repo.get_commit_from_gitpython(c_object)
+            yield commit_row(commit, columns["commits"]), modified_file_rows(git_repo, commit, pathspecs, columns["modified_files"])
+        return
+
+    revs = rev if isinstance(rev, list) else [rev]
+    hashes = git_repo.repo.git.rev_list(*revs, "--", *(pathspecs or []), **options).split()
+    shards = [hashes[i:i + COMMITS_PER_SHARD] for i in range(0, len(hashes), COMMITS_PER_SHARD)]
+    logger.info(f"Diffing {len(hashes)} commits in {len(shards)} shards across {workers} workers")
+
+    ctx = multiprocessing.get_context()
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(str(git_repo.path), pathspecs, columns, ctx.Lock())) as pool:
+        for rows in pool.imap(_extract_shard, shards):
+            yield from rows
+
+
+# One record per commit: header fields separated by \x1f, followed by the NUL-separated --raw/--numstat entries
+GIT_LOG_FORMAT = "%x1e%H%x1f%P%x1f%an%x1f%ae%x1f%aI%x1f%B%x1f"
+
+
+def parse_git_log_record(record, columns=None):
+    """Parse one `git log -z --raw --numstat` record into (commit row, modified file rows).
+
+    `columns` is the projection of each table, see resolve_columns. Without line counts, the record
+    has no --numstat entries, and without modified files no --raw entries either.
+    """
+    columns = columns or resolve_columns()
+    commit_hash, parents, author_name, author_email, author_date, msg, changes = record.split("\x1f", 6)
+    author_date = datetime.fromisoformat(author_date)
+    commit = {
+        "commit_hash": commit_hash,
+        "commit_msg": msg.strip(),
+        "author_name": author_name,
+        "author_email": author_email,
+        "author_date": author_date,
+        # Same convention as pydriller/GitPython: seconds west of UTC
+        "author_timezone": -int(author_date.utcoffset().total_seconds()),
+        "merge": len(parents.split()) > 1,
+    }
+    commit = {name: commit[name] for name in columns["commits"]}
+    if not columns["modified_files"]:
+        return commit, []
+
+    # --raw entries come first and carry the change type, --numstat entries follow in the same order
+    paths = []
+    counts = []
+    tokens = changes.split("\0")
+    i = 0
+    while i < len(tokens):
+        token = tokens[i].lstrip("\n")
+        i += 1
+        if not token:
+            continue
+        if token.startswith(":"):
+            status = token.split()[-1]
+            if status[0] in "RC":
+                paths.append((tokens[i], tokens[i + 1]))
+                i += 2
+            elif status == "A":
+                paths.append((None, tokens[i]))
+                i += 1
+            elif status == "D":
+                paths.append((tokens[i], None))
+                i += 1
+            else:
+                paths.append((tokens[i], tokens[i]))
+                i += 1
+        else:
+            added, deleted, path = token.split("\t", 2)
+            if not path:
+                # Renames list the old and new path as two extra tokens
+                i += 2
+            # Binary files are reported as "-"
+            counts.append((0 if added == "-" else int(added), 0 if deleted == "-" else int(deleted)))
+
+    if not any(name in columns["modified_files"] for name in LINE_COLUMNS):
+        counts = [(None, None)] * len(paths)
+    modified_files = [
+        {
+            "commit_hash": commit_hash,
+            "filename": PurePosixPath(new_path if new_path is not None else old_path).name,
+            "old_path": old_path,
+            "new_path": new_path,
+            "added_lines": added,
+            "deleted_lines": deleted,
+        }
+        for (old_path, new_path), (added, deleted) in zip(paths, counts)
+    ]
+    return commit, modified_files
+
+
+def extract_commits_git_log(git_repo, rev, options, pathspecs=None, columns=None):
+    """Yield (commit row, modified file rows) for every commit in `rev`, newest first, from one `git log` pass.
+
+    Produces the same rows as the pydriller backend (merge commits have no modified files, renames are
+    detected with -M) without building a full diff for every commit. Only what the projection in
+    `columns` needs is asked of git: no line counts without --numstat, and no file lists without --raw.
+    """
+    columns = columns or resolve_columns()
+    revs = rev if isinstance(rev, list) else [rev]
+    log_format = GIT_LOG_FORMAT if "commit_msg" in columns["commits"] else GIT_LOG_FORMAT.replace("%B", "")
+    changes = []
+    if columns["modified_files"]:
+        # --first-parent would otherwise diff merges against their first parent, which pydriller doesn't
+        changes = ["-M", "--raw", "--diff-merges=off"]
+        if any(name in columns["modified_files"] for name in LINE_COLUMNS):
+            changes.append("--numstat")
+    process = subprocess.Popen(
+        ["git", "-C", str(git_repo.path), "log", "-z", *changes,
+         f"--format={log_format}", *git_repo.repo.git.transform_kwargs(**options), *revs, "--", *(pathspecs or [])],
+        stdout=subprocess.PIPE,
+    )
+    buffer = b""
+    try:
+        while True:
+            chunk = process.stdout.read(GIT_LOG_READ_SIZE)
+            if chunk:
+                buffer += chunk
+                *records, buffer = buffer.split(b"\x1e")
+            else:
+                records, buffer = [buffer], b""
+            for record in records:
+                if not record:
+                    continue
+                yield parse_git_log_record(record.decode("utf-8", errors="replace"), columns)
+            if not chunk:
+                break
+    finally:
+        # Stop git early if the consumer doesn't read the whole history
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        if process.wait() not in (0, -signal.SIGKILL):
+            raise RuntimeError(f"git log failed with exit code {process.returncode}")
+
+
+def open_writers(targets, schemas, options, name=None, pipeline=False, checkpoint=None):
+    """Open the commits and modified files writers, writing the part files of the next chunk when checkpointing.
+
+    `targets` has the target of each table, and `name` the name of its files in hive partitions. A
+    table without a schema isn't extracted, and gets a NullWriter.
+    """
+    writers = []
+    for table, schema in zip(["commits", "modified_files"], schemas):
+        if schema is None:
+            writers.append(NullWriter())
+            continue
+        target = targets[table]
+        if checkpoint:
+            target, name = checkpoint.part_root(table), checkpoint.part_name()
+            if options.layout == "snapshot":
+                target = f"{target}/{name}.parquet"
+        writer = open_table_writer(target, schema, options, table, name)
+        if pipeline:
+            writer = ThreadedWriter(writer, table)
+        writers.append(writer)
+    return writers
+
+
+def download_commits(
+    repo_url, repo_slug, repo_name, *, use_local=True, bucket=None, gcs_key_file=None, s3_options=None, incremental=False,
+    traversal=None, writer_options=None, backend="pydriller", workers=1, cache_dir=None, cache_max_size=None, pipeline=False,
+    checkpoint_every=None, columns=None, commits_only=False,
+):
+    """Download commits and modified files from a GitHub repository, newest first. Returns the run report.
+
+    `traversal` selects the commits downloaded (all of them by default), `writer_options` how they are
+    written and `s3_options` how they are uploaded to an s3:// bucket. `columns` and `commits_only`
+    select the columns and tables to extract, see resolve_columns.
+    """
+    traversal = traversal or TraversalOptions()
+    writer_options = writer_options or WriterOptions()
+    s3_options = s3_options or S3Options()
+    stats = RunStats()
+    projection = resolve_columns(columns, commits_only)
+    logger.info(f"Downloading commits from {repo_url}")
+    if traversal.limit:
+        logger.info(f"Limiting to {traversal.limit} most recent commits")
+    if traversal.since or traversal.until:
+        logger.info(f"Limiting to commits between {traversal.since or 'the first commit'} and {traversal.until or 'now'}")
+
+    if not use_local and bucket.startswith("s3://"):
+        configure_s3(s3_options.endpoint_url, s3_options.part_size, s3_options.concurrency)
+    elif not use_local:
+        configure_gcs_credentials(gcs_key_file)
+    if use_local:
+        Path("data").mkdir(exist_ok=True)
+    directory, prefix = output_location(use_local, repo_name, bucket, repo_slug)
+
+    commits_glob = table_glob("commits", use_local, repo_name, bucket, repo_slug, writer_options.layout)
+    modified_files_glob = table_glob("modified_files", use_local, repo_name, bucket, repo_slug, writer_options.layout)
+    with stats.stage("prepare"):
+        previous = read_last_commit(directory, prefix, commits_glob, modified_files_glob) if incremental else None
+        superseded = superseded_files(previous) if previous else superseded_files(read_manifest(directory, prefix), replaced=True)
+
+        # A full hive-layout run replaces the repository's partitions once the new files are written
+        existing = list_files(commits_glob) + list_files(modified_files_glob)
+        replaced = existing if writer_options.layout == "hive" and not previous else []
+
+        # Part files of an interrupted run with the same settings are picked up where it stopped
+        checkpoint = None
+        if checkpoint_every:
+            settings = {
+                **traversal.filters(),
+                "incremental": incremental,
+                "layout": writer_options.layout,
+                "backend": backend,
+                "columns": projection,
+            }
+            checkpoint = Checkpoint(f"{directory}/_staging/{prefix}checkpoint", settings)
+            if checkpoint.load():
+                logger.info(f"Resuming from checkpoint after {checkpoint.state['commits']} commits ({checkpoint.state['last_commit_hash']})")
+    resuming = bool(checkpoint and checkpoint.state)
+    if previous and not resuming:
+        logger.info(f"Resuming after commit {previous['last_commit_hash']} ({previous['last_author_date']})")
+        if previous.get("columns", projection) != projection:
+            logger.warning("The previous snapshots were written with different columns, the new files won't have the same schema")
+
+    # Only fetch the history that is needed, unless resuming from a previous commit that may be older.
+    # Path filters and --no-merges skip commits, so the newest `limit` matching ones can be any depth down
+    filtered = bool(traversal.include_paths or traversal.exclude_paths or traversal.no_merges)
+    depth = traversal.limit if not incremental and not traversal.until and not resuming and not filtered else None
+    shallow_since = traversal.since if not incremental and not filtered else None
+    details = {"repo_slug": repo_slug, "backend": backend, "workers": workers, "layout": writer_options.layout, "incremental": incremental, "pipeline": pipeline, "sort": writer_options.sort, "columns": projection}
+    clone_started = time.perf_counter()
+    with open_repository(repo_url, cache_dir, repo_slug, cache_max_size, depth, shallow_since, traversal.branch) as git_repo:
+        stats.stages["clone"] = time.perf_counter() - clone_started
+        if resuming:
+            # Carry on traversing the exact history the checkpointed run started on
+            head_hash, rev = checkpoint.state["head_hash"], checkpoint.state["rev"]
+            after_commit = checkpoint.state["after_commit"]
+            head_date = git_repo.get_commit(head_hash).author_date
+        else:
+            tip = traversal.branch or "HEAD"
+            head = git_repo.get_commit(tip)
+            head_hash, head_date = head.hash, head.author_date
+            if previous and previous["last_commit_hash"] == head_hash:
+                logger.info(f"{tip} has not moved since the last run ({head_hash}), nothing to write")
+                report = stats.report(**details, last_commit_hash=head_hash)
+                write_run_report(directory, prefix, report)
+                return report
+
+            # Pin the traversal to the commit the branch points at now, so a resumed run sees the same history
+            rev = head_hash
+            after_commit = None
+            if previous:
+                try:
+                    git_repo.get_commit(previous["last_commit_hash"])
+                    rev = [head_hash, f"^{previous['last_commit_hash']}"]
+                    after_commit = previous["last_commit_hash"]
+                except Exception:
+                    logger.warning(f"Commit {previous['last_commit_hash']} is no longer in the history, downloading everything")
+            if checkpoint:
+                checkpoint.start(head_hash, rev, after_commit, next_timestamp(existing))
+        if not after_commit:
+            previous = None
+
+        # Record which part of the history the snapshot contains, and which columns, in the parquet metadata
+        filters = {**traversal.filters(), "after_commit": after_commit}
+        metadata = {"schema_version": str(SCHEMA_VERSION), "filters": json.dumps(filters), "columns": json.dumps(projection)}
+        schemas = (
+            project_schema(COMMITS_SCHEMA, projection["commits"], metadata),
+            project_schema(MODIFIED_FILES_SCHEMA, projection["modified_files"], metadata),
+        )
+
+        # Stream the commits and modified files straight into their parquet files
+        timestamp = next_timestamp(existing)
+        targets = {table: table_target(table, use_local, repo_name, bucket, repo_slug, writer_options.layout, timestamp) for table in ["commits", "modified_files"]}
+        commits_writer, modified_files_writer = open_writers(targets, schemas, writer_options, timestamp, pipeline, checkpoint)
+
+        try:
+            # Traverse the commits in the repository, newest first, skipping filtered commits and files in git itself
+            pathspecs = path_filters(traversal.include_paths, traversal.exclude_paths)
+            options = history_options(traversal.limit, traversal.since, traversal.until, traversal.no_merges, traversal.first_parent, pathspecs)
+            count = file_changes = 0
+            if resuming:
+                count, file_changes = checkpoint.state["commits"], checkpoint.state["file_changes"]
+                options["skip"] = count
+                if traversal.limit:
+                    options["max_count"] = traversal.limit - count
+            if traversal.limit and count >= traversal.limit:
+                extracted = []
+            elif backend == "git-log":
+                if workers > 1:
+                    logger.info("The git-log backend reads history in a single pass, ignoring --workers")
+                extracted = extract_commits_git_log(git_repo, rev, options, pathspecs, projection)
+            else:
+                extracted = extract_commits(git_repo, rev, options, pathspecs, workers, projection)
+
+            for commit, files in stats.timed("traverse", extracted):
+                with stats.stage("write"):
+                    key = partition_key(commit) if writer_options.layout == "hive" else None
+                    if pipeline:
+                        commits_writer.append_rows(key, [commit])
+                        modified_files_writer.append_rows(key, files)
+                    else:
+                        append_rows(commits_writer, key, [commit])
+                        append_rows(modified_files_writer, key, files)
+
+                count += 1
+                file_changes += len(files)
+                stats.commits += 1
+                stats.file_changes += len(files)
+                if count % 100 == 0:
+                    logger.info(f"Processed {count} commits ({stats.commits / stats.elapsed():.0f} commits/s)...")
+
+                if checkpoint and count % checkpoint_every == 0:
+                    with stats.stage("checkpoint"):
+                        close_writers(commits_writer, modified_files_writer)
+                        stats.record_writer("commits", commits_writer)
+                        stats.record_writer("modified_files", modified_files_writer)
+                        checkpoint.save(commits_writer, modified_files_writer, count, file_changes, commit["commit_hash"])
+                        commits_writer, modified_files_writer = open_writers(targets, schemas, writer_options, timestamp, pipeline, checkpoint)
+
+            if traversal.limit and count >= traversal.limit:
+                logger.info(f"Reached limit of {traversal.limit} commits")
+
+            with stats.stage("close"):
+                close_writers(commits_writer, modified_files_writer)
+        except BaseException:
+            # Abort the files being written, so no partly written file or multipart upload is left behind
+            abort_writers(commits_writer, modified_files_writer)
+            raise
+        stats.record_writer("commits", commits_writer)
+        stats.record_writer("modified_files", modified_files_writer)
+        cleanup_started = time.perf_counter()
+    stats.stages["cleanup"] = time.perf_counter() - cleanup_started
+
+    logger.info(f"Downloaded {count} commits with {file_changes} file modifications")
+
+    with stats.stage("finalize"):
+        if checkpoint:
+            # Publish the part files, then drop the staging area with the checkpoint
+            checkpoint.save(commits_writer, modified_files_writer, count, file_changes, checkpoint.state["last_commit_hash"])
+            written = {}
+            for table in ["commits", "modified_files"]:
+                target = table_target(table, use_local, repo_name, bucket, repo_slug, writer_options.layout, checkpoint.state["timestamp"])
+                written[table] = checkpoint.finalize(table, target, writer_options)
+            checkpoint.discard()
+        else:
+            written = {"commits": commits_writer.paths, "modified_files": modified_files_writer.paths}
+
+        if not written["commits"]:
+            logger.info("No new commits to write")
+
+        kept = {fsspec.core.url_to_fs(path)[1] for path in written["commits"] + written["modified_files"]}
+        stale = [path for path in replaced if fsspec.core.url_to_fs(path)[1] not in kept]
+        if stale:
+            logger.info(f"Removing {len(stale)} files from the previous snapshot")
+            fs, _ = fsspec.core.url_to_fs(stale[0])
+            fs.rm(stale)
+
+        # Record the newest traversed commit so the next incremental run can resume from it
+        files = previous["files"] if previous else {"commits": [], "modified_files": []}
+        files["commits"].extend(written["commits"])
+        files["modified_files"].extend(written["modified_files"])
+        superseded = {table: [path for path in paths if fsspec.core.url_to_fs(path)[1] not in kept] for table, paths in superseded.items()}
+        write_manifest(directory, prefix, {
+            "repo_slug": repo_slug,
+            "last_commit_hash": head_hash,
+            "last_author_date": head_date.isoformat(),
+            "filters": filters,
+            "columns": projection,
+            "files": files,
+            "superseded": superseded,
+            "updated_at": pd.Timestamp.now(tz="UTC").isoformat(),
+        })
+
+    report = stats.report(**details, last_commit_hash=head_hash, filters=filters)
+    logger.info(
+        f"Took {report['seconds']:.1f}s ({report['commits_per_second']:.0f} commits/s, "
+        f"{report['file_changes_per_second']:.0f} file changes/s), "
+        + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in report["stages"].items())
+    )
+    write_run_report(directory, prefix, report)
+    return report
+
+
+def _download_repository(repo_url, repo_slug, options):
+    """Download one repository of a batch, in a process of the batch's pool."""
+    return download_commits(repo_url, repo_slug, sanitize_name(repo_slug), **options)
+
+
+def download_batch(repos, workers=1, cache_dir=None, cache_max_size=None, **options):
+    """Download several repositories into one hive-partitioned dataset, sharing a pool of `workers` processes.
+
+    `repos` is a list of (repo_url, repo_slug) pairs and every repository gets the same `options` as
+    download_commits(). Each repository is downloaded by a single process, so a long history does not
+    hold up the smaller ones, and the mirror cache is only trimmed once every download is done.
+    Returns the run reports and the errors, by repository slug.
+    """
+    names = [sanitize_name(repo_slug) for _, repo_slug in repos]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Repositories would share the repo={duplicates[0]} partition, download them separately")
+
+    reports, failed = {}, {}
+    stats = RunStats()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(_download_repository, repo_url, repo_slug, dict(options, cache_dir=cache_dir)): repo_slug
+            for repo_url, repo_slug in repos
+        }
+        for future in as_completed(futures):
+            repo_slug = futures[future]
+            try:
+                reports[repo_slug] = future.result()
+                logger.info(f"Downloaded {repo_slug} ({len(reports)} of {len(repos)} done)")
+            except Exception as error:
+                logger.error(f"Failed to download {repo_slug}: {error}")
+                failed[repo_slug] = error
 
-    return
+    if cache_dir and cache_max_size:
+        evict_mirrors(cache_dir, cache_max_size * 1e9)
+    commits = sum(report["commits"] for report in reports.values())
+    logger.info(f"Downloaded {len(reports)} repositories with {commits} commits in {stats.elapsed():.1f}s")
+    return reports, failed
 
 
 def main():
@@ -133,13 +1654,27 @@ Examples:
   python download_commits.py duckdb/duckdb --gcs --bucket gs://my-bucket/github-analytics
   python download_commits.py duckdb/duckdb --gcs --bucket gs://my-bucket/github-analytics --limit 1000
   
+  # Upload to S3, or an S3-compatible store such as MinIO
+  python download_commits.py duckdb/duckdb --s3 --bucket s3://my-bucket/github-analytics
+  python download_commits.py duckdb/duckdb --s3 --bucket s3://my-bucket/github-analytics --s3-part-size 64 --s3-concurrency 8
+  
   # Save locally (for testing)
   python download_commits.py duckdb/duckdb --local --limit 1000
+  python download_commits.py duckdb/duckdb --local --since 2024-01-01 --until 2024-12-31
+
+  # Only download commits added since the last run
+  python download_commits.py duckdb/duckdb --gcs --bucket gs://my-bucket/github-analytics --incremental
+
+  # Download several repositories into one hive-partitioned dataset, three at a time
+  python download_commits.py duckdb/duckdb rilldata/rill clickhouse/clickhouse --local --workers 3 --incremental
         """
     )
     parser.add_argument(
-        "repo_slug",
-        help="GitHub repository in format 'owner/repo' (e.g., 'rilldata/rill')"
+        "repo_slugs",
+        nargs="+",
+        metavar="repo_slug",
+        help="GitHub repository in format 'owner/repo' (e.g., 'rilldata/rill'). Several repositories are downloaded "
+             "in a batch, into one hive-partitioned dataset"
     )
     parser.add_argument(
         "--local",
@@ -154,27 +1689,178 @@ Examples:
     parser.add_argument(
         "--s3",
         action="store_true",
-        help="Save to Amazon S3 (not yet supported - use GCS for now)"
+        help="Save to Amazon S3 or an S3-compatible store (credentials come from the usual AWS environment variables or config)"
     )
     parser.add_argument(
         "--bucket",
-        help="Cloud storage bucket path (required with --gcs, e.g., gs://my-bucket/github-analytics)"
+        help="Cloud storage bucket path (required with --gcs or --s3, e.g., gs://my-bucket/github-analytics or s3://my-bucket/github-analytics)"
     )
     parser.add_argument(
         "--gcs-key-file",
         help="Path to GCS service account key file (optional if GOOGLE_APPLICATION_CREDENTIALS is set)"
     )
+    parser.add_argument(
+        "--s3-endpoint-url",
+        help="Endpoint of an S3-compatible store, e.g. http://localhost:9000 for MinIO (default: AWS)"
+    )
+    parser.add_argument(
+        "--s3-part-size",
+        type=int,
+        default=DEFAULT_S3_PART_SIZE // 2**20,
+        metavar="MB",
+        help=f"Size of each part of the multipart upload to S3 (default: {DEFAULT_S3_PART_SIZE // 2**20}, minimum: {MIN_S3_PART_SIZE // 2**20})"
+    )
+    parser.add_argument(
+        "--s3-concurrency",
+        type=int,
+        default=DEFAULT_S3_CONCURRENCY,
+        help=f"Number of parts uploaded to S3 at once (default: {DEFAULT_S3_CONCURRENCY})"
+    )
     parser.add_argument(
         "--limit",
         type=int,
-        help="Limit number of commits to download (useful for testing)"
+        help="Only download the N most recent commits, with a shallow clone (useful for testing)"
+    )
+    parser.add_argument(
+        "--since",
+        help="Only download commits committed after this date (e.g. 2024-01-01), with a shallow clone"
+    )
+    parser.add_argument(
+        "--until",
+        help="Only download commits committed before this date (e.g. 2024-12-31)"
+    )
+    parser.add_argument(
+        "--branch",
+        help="Only download commits reachable from this branch (default: the repository's default branch)"
+    )
+    parser.add_argument(
+        "--first-parent",
+        action="store_true",
+        help="Only follow the first parent of merge commits, i.e. commits made directly on the branch"
+    )
+    parser.add_argument(
+        "--no-merges",
+        action="store_true",
+        help="Skip merge commits"
+    )
+    parser.add_argument(
+        "--include-path",
+        action="append",
+        dest="include_paths",
+        metavar="PATTERN",
+        help="Only download changes to files matching this git pathspec, e.g. 'src/' or '*.py' (repeatable)"
+    )
+    parser.add_argument(
+        "--exclude-path",
+        action="append",
+        dest="exclude_paths",
+        metavar="PATTERN",
+        help="Skip changes to files matching this git pathspec, e.g. 'docs/' (repeatable)"
+    )
+    parser.add_argument(
+        "--layout",
+        choices=LAYOUTS,
+        help="Write one timestamped file per table, or hive partitions by repo/year/month "
+             "(default: snapshot, or hive with several repositories)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only download commits newer than the last ingested one and write them as an additional file"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Number of rows buffered in memory before being converted to an Arrow batch (default: {DEFAULT_BATCH_SIZE})"
+    )
+    parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=DEFAULT_ROW_GROUP_SIZE,
+        help=f"Number of rows per parquet row group (default: {DEFAULT_ROW_GROUP_SIZE})"
+    )
+    parser.add_argument(
+        "--compression",
+        type=int,
+        default=DEFAULT_COMPRESSION_LEVEL,
+        metavar="LEVEL",
+        help=f"zstd compression level of the parquet files, 1-22 (default: {DEFAULT_COMPRESSION_LEVEL})"
+    )
+    parser.add_argument(
+        "--sort",
+        action="store_true",
+        help="Sort commits by author_date and modified files by commit_hash, and write page indexes, so readers "
+             "can skip row groups. Each file (or partition) is held in memory until it is written"
+    )
+    parser.add_argument(
+        "--bloom-filter",
+        action="store_true",
+        help="Write bloom filters on commit_hash, for faster lookups and joins by commit"
+    )
+    parser.add_argument(
+        "--columns",
+        type=lambda value: [name.strip() for name in value.split(",") if name.strip()],
+        metavar="NAMES",
+        help="Comma-separated columns to extract, from either table, e.g. 'author_name,author_date,new_path'. "
+             "Other columns are never computed, and modified files are only extracted if one of their columns "
+             "is listed (default: all)"
+    )
+    parser.add_argument(
+        "--commits-only",
+        action="store_true",
+        help="Only extract the commits table, without listing or diffing the files of each commit"
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Encode and upload each table on its own thread while the history is still being traversed"
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        metavar="N",
+        help="Stage the output as part files and record a checkpoint every N commits, so an interrupted run "
+             "restarted with the same arguments carries on from the last checkpoint"
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="Profile the run with cProfile and write the stats to PATH (only covers the main process)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to diff commits in parallel, or with several repositories, the number of "
+             "repositories downloaded at once (default: 1)"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="pydriller",
+        help="How history is read: per-commit pydriller diffs, or one streaming 'git log --numstat' pass (default: pydriller)"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Keep a bare mirror of each repository in this directory and fetch into it instead of re-cloning"
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        type=float,
+        help="Evict the least recently used mirrors once the cache grows beyond this many GB"
     )
     
     args = parser.parse_args()
     
-    # Construct repo URL (always use HTTPS)
-    repo_url = f"https://github.com/{args.repo_slug}.git"
-    repo_name = sanitize_name(args.repo_slug)
+    # Construct repo URLs (always use HTTPS)
+    repos = [(f"https://github.com/{slug}.git", slug) for slug in args.repo_slugs]
+    batch = len(repos) > 1
+    layout = args.layout or ("hive" if batch else "snapshot")
+    
+    if batch and layout != "hive":
+        logger.error("Several repositories can only be downloaded with --layout hive, into one dataset")
+        return 1
     
     # Determine storage location
     storage_flags = sum([args.local, args.gcs, args.s3])
@@ -187,29 +1873,90 @@ Examples:
         logger.error("Cannot specify multiple storage locations")
         return 1
     
-    if args.s3:
-        logger.error("S3 support is not yet implemented. Please use --gcs for cloud storage.")
-        logger.info("You can still use S3 with Rill by manually uploading the parquet files.")
-        return 1
-    
     if args.gcs and not args.bucket:
         logger.error("--bucket is required when using --gcs")
         return 1
     
+    if args.s3 and not (args.bucket or "").startswith("s3://"):
+        logger.error("--bucket is required when using --s3, e.g. --bucket s3://my-bucket/github-analytics")
+        return 1
+    
+    if args.s3_part_size < MIN_S3_PART_SIZE // 2**20:
+        logger.error(f"--s3-part-size must be at least {MIN_S3_PART_SIZE // 2**20} MB")
+        return 1
+    
+    if args.bloom_filter and "bloom_filter_options" not in inspect.signature(pq.ParquetWriter).parameters:
+        logger.error(f"--bloom-filter needs a newer pyarrow than {pa.__version__}, one that can write bloom filters")
+        return 1
+    
+    try:
+        projection = resolve_columns(args.columns, args.commits_only)
+    except ValueError as error:
+        logger.error(str(error))
+        return 1
+    
     use_local = args.local
     
-    logger.info(f"Repository: {args.repo_slug}")
-    logger.info(f"Storage: {'Local (data/)' if use_local else 'GCS'}")
+    logger.info(f"Repositor{'ies' if batch else 'y'}: {', '.join(args.repo_slugs)}")
+    logger.info(f"Storage: {'Local (data/)' if use_local else 'S3' if args.s3 else 'GCS'}")
+    if args.columns is not None or args.commits_only:
+        logger.info(f"Columns: {', '.join(f'{table} ({len(names)})' for table, names in projection.items() if names)}")
     
-    download_commits(
-        repo_url=repo_url,
-        repo_slug=args.repo_slug,
-        repo_name=repo_name,
-        use_local=use_local,
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+
+    traversal = TraversalOptions(
         limit=args.limit,
-        gcs_bucket=args.bucket,
-        gcs_key_file=args.gcs_key_file if args.gcs else None
+        since=args.since,
+        until=args.until,
+        branch=args.branch,
+        first_parent=args.first_parent,
+        no_merges=args.no_merges,
+        include_paths=args.include_paths,
+        exclude_paths=args.exclude_paths,
+    )
+    writer_options = WriterOptions(
+        batch_size=args.batch_size,
+        layout=layout,
+        row_group_size=args.row_group_size,
+        compression_level=args.compression,
+        sort=args.sort,
+        bloom_filter=args.bloom_filter,
     )
+    s3_options = S3Options(args.s3_endpoint_url, args.s3_part_size * 2**20, args.s3_concurrency)
+    options = dict(
+        use_local=use_local,
+        bucket=args.bucket,
+        gcs_key_file=args.gcs_key_file if args.gcs else None,
+        s3_options=s3_options,
+        incremental=args.incremental,
+        traversal=traversal,
+        writer_options=writer_options,
+        workers=args.workers,
+        backend=args.backend,
+        cache_dir=args.cache_dir,
+        cache_max_size=args.cache_max_size,
+        pipeline=args.pipeline,
+        checkpoint_every=args.checkpoint_every,
+        columns=args.columns,
+        commits_only=args.commits_only
+    )
+    if batch:
+        failed = download_batch(repos, **options)[1]
+    else:
+        repo_url, repo_slug = repos[0]
+        download_commits(repo_url, repo_slug, sanitize_name(repo_slug), **options)
+        failed = {}
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        logger.info(f"Wrote profile to {args.profile}, inspect it with: python -m pstats {args.profile}")
+    
+    if failed:
+        logger.error(f"Failed to download {', '.join(failed)}")
+        return 1
     
     logger.info("\n✅ Download complete!")
     if use_local:
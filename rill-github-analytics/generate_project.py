@@ -4,20 +4,27 @@ Setup script to generate Rill project files for analyzing any GitHub repository.
 
 Usage:
     python generate_project.py owner/repo --gcs --bucket gs://bucket/path [--display-name "My Repo"]
+    python generate_project.py owner/repo --s3 --bucket s3://bucket/path [--display-name "My Repo"]
     python generate_project.py owner/repo --local [--display-name "My Repo"]
+    python generate_project.py owner/repo owner/other-repo ... --local [--name NAME]
 
 Examples:
     python generate_project.py duckdb/duckdb --gcs --bucket gs://my-bucket/github-analytics
+    python generate_project.py duckdb/duckdb --s3 --bucket s3://my-bucket/github-analytics
     python generate_project.py duckdb/duckdb --local
     python generate_project.py clickhouse/clickhouse --gcs --bucket gs://my-bucket --display-name "ClickHouse"
+    python generate_project.py duckdb/duckdb rilldata/rill clickhouse/clickhouse --gcs --bucket gs://my-bucket/github-analytics
 """
 
 import argparse
 import logging
 import os
 import re
+import textwrap
 from pathlib import Path
 
+from schema import resolve_columns
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -32,27 +39,191 @@ def sanitize_name(repo_slug):
     return repo_slug.split("/")[-1].replace("-", "_").lower()
 
 
-def create_source_files(name, repo_slug, use_local=True, gcs_bucket=None):
-    """Generate source YAML files for commits and modified files."""
+# The snapshot timestamp in the name of every parquet file written by download_commits.py
+SNAPSHOT_PATTERN = r"(\d{14})(-\d+)?\.parquet$"
+
+# Columns of the model: its name, how it is selected from commits `c` joined with modified files,
+# and the downloaded columns it needs
+MODEL_COLUMNS = [
+    ("date", "author_date AS date", ["author_date"]),
+    ("commit_hash", "c.commit_hash", ["commit_hash"]),
+    ("commit_message", "commit_msg AS commit_message", ["commit_msg"]),
+    ("username", "author_name AS username", ["author_name"]),
+    ("is_merge_commit", "merge AS is_merge_commit", ["merge"]),
+    ("file_path", "new_path AS file_path", ["new_path"]),
+    ("filename", "filename", ["filename"]),
+    ("file_extension", "file_extension", ["file_extension"]),
+    ("first_directory", "first_directory", ["first_directory"]),
+    ("second_directory", "second_directory", ["second_directory"]),
+    ("second_directory_concat", "second_directory_concat", ["second_directory_concat"]),
+    ("additions", "added_lines AS additions", ["added_lines"]),
+    ("deletions", "deleted_lines AS deletions", ["deleted_lines"]),
+    ("changes", "additions + deletions AS changes", ["added_lines", "deleted_lines"]),
+    ("previous_file_path", "old_path AS previous_file_path", ["old_path"]),
+]
+
+# Dimensions of the metrics view: name, display name, model column and description
+DIMENSIONS = [
+    ("commit_hash", "Commit hash", "commit_hash", ""),
+    ("commit_message", "Commit message", "commit_message", ""),
+    ("username", "Username", "username", ""),
+    ("file_path", "File path", "file_path", ""),
+    ("filename", "Filename", "filename", ""),
+    ("file_extension", "File extension", "file_extension", ""),
+    ("first_directory", "First directory", "first_directory", ""),
+    ("second_directory", "Second directory", "second_directory_concat", ""),
+    ("previous_file_path", "Previous file path", "previous_file_path", ""),
+    ("is_merge_commit", "Merge commit", "is_merge_commit", "True if the commit is a merge commit"),
+]
+
+# Measures of the metrics view: name, display name, expression, description, format and the model columns it needs
+MEASURES = [
+    ("count_distinct_commit_hash", "Number of commits", "count(distinct commit_hash)", "", "humanize", ["commit_hash"]),
+    ("count_distinct_filename", "Number of files touched", "count(distinct filename)", "", "humanize", ["filename"]),
+    ("count_distinct_username", "Number of contributors", "count(distinct username)", "", "humanize", ["username"]),
+    ("sum_of_additions", "Code additions", "sum(additions)", "", "humanize", ["additions"]),
+    ("sum_of_deletions", "Code deletions", "sum(deletions)", "", "humanize", ["deletions"]),
+    ("sum_of_changes", "Code changes", "sum(changes)", "", "humanize", ["changes"]),
+    ("percent_code_change", "Code deletion %", "sum(deletions) / sum(changes)",
+     "The percentage of code changes that were deletions.", "percentage", ["deletions", "changes"]),
+    # Without modified files there is one row per commit, so only count rows per commit when there are files
+    ("count_files_touched_per_commit", "Files touched per commit", "count(*) / count(distinct commit_hash)", "", "humanize", ["file_path"]),
+]
+
+# Model columns the daily rollup is computed from
+ROLLUP_COLUMNS = ["date", "commit_hash", "username", "first_directory", "second_directory_concat", "filename", "additions", "deletions", "changes"]
+
+
+def model_columns(projection=None):
+    """Names of the model columns that can be computed from the columns downloaded, see download_commits.py --columns."""
+    projection = projection or resolve_columns()
+    downloaded = set(projection["commits"]) | set(projection["modified_files"])
+    return [name for name, _, columns in MODEL_COLUMNS if set(columns) <= downloaded]
+
+
+def model_select(projection=None):
+    """The select list of the model, of the columns that can be computed from the columns downloaded."""
+    available = model_columns(projection)
+    return "".join(f"    {expression},\n" for name, expression, _ in MODEL_COLUMNS if name in available)
+
+
+def hive_source_sql(root, table, repos, lookback_months=None, filename=None):
+    """SQL reading one table of a hive-partitioned download for some repositories, pruned to the most recent months.
+
+    With `filename`, the path of the file every row was read from is added as a column of that name.
+    """
+    partition = repos[0] if len(repos) == 1 else "*"
+    sql = (
+        f"SELECT * FROM read_parquet('{root}/{table}/repo={partition}/*/*/*.parquet', "
+        f"hive_partitioning = true, hive_types = {{'year': INTEGER, 'month': INTEGER}}"
+        + (f", filename = '{filename}')" if filename else ")")
+    )
+    # Only filters on the partition columns let DuckDB skip whole files
+    filters = []
+    if len(repos) > 1:
+        filters.append(f"repo IN ({', '.join(repr(repo) for repo in repos)})")
+    if lookback_months:
+        filters.append(f"make_date(year, month, 1) >= date_trunc('month', current_date - INTERVAL {lookback_months} MONTH)")
+    if filters:
+        sql += " WHERE " + " AND ".join(filters)
+    return sql
+
+
+def create_s3_connector_file(endpoint_url=None):
+    """Generate the S3 connector, reading credentials from the project's .env file."""
+    connector_yaml = """type: connector
+driver: s3
+
+aws_access_key_id: {{ .env.aws_access_key_id }}
+aws_secret_access_key: {{ .env.aws_secret_access_key }}
+"""
+    if endpoint_url:
+        connector_yaml += f"endpoint: {endpoint_url}\n"
+    
+    os.makedirs("connectors", exist_ok=True)
+    connector_path = "connectors/s3.yaml"
+    with open(connector_path, "w") as f:
+        f.write(connector_yaml)
+    logger.info(f"Created {connector_path}")
+
+
+def create_source_files(name, repo_slug, use_local=True, bucket=None, incremental=False, layout="snapshot", lookback_months=None, repos=None, projection=None):
+    """Generate source YAML files for commits and modified files, of one repository or of the `repos` partitions.
+
+    Without modified files in the `projection`, only the commits source is generated.
+    """
     
-    if use_local:
+    repos = repos or [name]
+    projection = projection or resolve_columns()
+    
+    connector = "s3" if bucket and bucket.startswith("s3://") else "gcs"
+    
+    if layout == "hive" and use_local:
+        # Local DuckDB sources over hive partitions
+        commits_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
+
+type: "duckdb"
+sql: "{hive_source_sql('data', 'commits', repos, lookback_months)}"
+"""
+        modified_files_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
+
+type: "duckdb"
+sql: "{hive_source_sql('data', 'modified_files', repos, lookback_months)}"
+"""
+    elif layout == "hive":
+        # Cloud hive partitions, read through DuckDB so partitions outside the lookback window are skipped
+        commits_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
+
+type: model
+materialize: true
+
+connector: duckdb
+create_secrets_from_connectors: {connector}
+
+sql: |
+  {hive_source_sql(bucket, 'commits', repos, lookback_months)}
+"""
+        modified_files_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
+
+type: model
+materialize: true
+
+connector: duckdb
+create_secrets_from_connectors: {connector}
+
+sql: |
+  {hive_source_sql(bucket, 'modified_files', repos, lookback_months)}
+"""
+    elif use_local:
         # Local DuckDB sources
         commits_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
 
 type: "duckdb"
-sql: "SELECT * FROM read_parquet('data/{name}_commits*.parquet')"
+sql: "SELECT * FROM read_parquet('data/{repos[0]}_commits*.parquet')"
 """
         modified_files_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
 
 type: "duckdb"
-sql: "SELECT * FROM read_parquet('data/{name}_modified_files*.parquet')"
+sql: "SELECT * FROM read_parquet('data/{repos[0]}_modified_files*.parquet')"
+"""
+    elif incremental:
+        # Cloud sources made of a base snapshot plus incremental deltas, so read every file
+        commits_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
+
+connector: "{connector}"
+uri: "{bucket}/{repo_slug}/commits*.parquet"
+"""
+        modified_files_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
+
+connector: "{connector}"
+uri: "{bucket}/{repo_slug}/modified_files*.parquet"
 """
     else:
-        # GCS sources
+        # Cloud sources
         commits_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
 
-connector: "gcs"
-uri: "{gcs_bucket}/{repo_slug}/commits*.parquet"
+connector: "{connector}"
+uri: "{bucket}/{repo_slug}/commits*.parquet"
 # Get the most recent file
 extract:
   files:
@@ -61,8 +232,8 @@ extract:
 """
         modified_files_source = f"""# Visit https://docs.rilldata.com/ to learn more about Rill code files.
 
-connector: "gcs"
-uri: "{gcs_bucket}/{repo_slug}/modified_files*.parquet"
+connector: "{connector}"
+uri: "{bucket}/{repo_slug}/modified_files*.parquet"
 # Get the most recent file
 extract:
   files:
@@ -79,61 +250,153 @@ extract:
     logger.info(f"Created {commits_path}")
     
     modified_path = f"sources/{name}_modified_files.yaml"
+    if not projection["modified_files"]:
+        if os.path.exists(modified_path):
+            os.remove(modified_path)
+            logger.info(f"Removed {modified_path}")
+        return
     with open(modified_path, "w") as f:
         f.write(modified_files_source)
     logger.info(f"Created {modified_path}")
 
 
-def create_model_file(name):
-    """Generate the SQL model file."""
+def create_model_file(name, repo_column=False, projection=None):
+    """Generate the SQL model file. With `repo_column`, several repositories are joined repository by repository.
+
+    The model only has the columns that can be computed from the `projection` downloaded, and no join
+    without modified files.
+    """
     
+    projection = projection or resolve_columns()
+    repo_select = "    c.repo,\n" if repo_column else ""
+    join = "c.repo = f.repo AND c.commit_hash = f.commit_hash" if repo_column else "c.commit_hash = f.commit_hash"
+    join_sql = f"LEFT JOIN {name}_modified_files f ON {join}\n" if projection["modified_files"] else ""
     model_sql = f"""-- Model SQL
 -- Reference documentation: https://docs.rilldata.com/reference/project-files/models
 -- @materialize: true
 
 SELECT
-    author_date AS date,
-    c.commit_hash,
-    commit_msg AS commit_message,
-    author_name AS username,
-    merge AS is_merge_commit,
-    new_path AS file_path,
-    filename,
-    RIGHT(filename, POSITION('.' IN REVERSE(filename))) AS file_extension,
-    CASE WHEN CONTAINS(file_path, '/')
-      THEN SPLIT_PART(file_path, '/', 1)
-      ELSE NULL
-    END AS first_directory,
-    CASE WHEN CONTAINS(SUBSTRING(file_path, LENGTH(first_directory) + 2), '/')
-      THEN SPLIT_PART(file_path, '/', 2)
-      ELSE NULL
-    END AS second_directory,
-    CASE 
-      WHEN first_directory IS NOT NULL AND second_directory IS NOT NULL
-        THEN CONCAT(first_directory, '/', second_directory) 
-      WHEN first_directory IS NOT NULL
-        THEN first_directory
-      WHEN first_directory IS NULL
-        THEN NULL
-    END AS second_directory_concat,
-    added_lines AS additions,
-    deleted_lines AS deletions, 
-    additions + deletions AS changes, 
-    old_path AS previous_file_path,
-FROM {name}_commits_source c
-LEFT JOIN {name}_modified_files f ON c.commit_hash = f.commit_hash
-"""
+{repo_select}{model_select(projection)}FROM {name}_commits_source c
+{join_sql}"""
     
+    write_model_file(f"models/{name}_commits_model.sql", model_sql)
+
+
+def create_incremental_model_file(name, repo_slug, use_local=True, bucket=None, layout="snapshot", lookback_months=None, repos=None, projection=None):
+    """Generate an incremental model that reads the parquet files itself, and on refresh only the snapshots written since.
+
+    The newest snapshot timestamp in the model is kept as its state. A refresh reads the files with a
+    later timestamp (full downloads, incremental deltas and compacted files alike) and merges their
+    rows into the model, one row per commit and file change, or per commit without modified files in
+    the `projection`.
+    """
+    repos = repos or [name]
+    projection = projection or resolve_columns()
+    repo_column = len(repos) > 1
+    connector = "s3" if bucket and bucket.startswith("s3://") else "gcs"
+
+    tables = {}
+    for table in [table for table in ["commits", "modified_files"] if projection[table]]:
+        if layout == "hive":
+            tables[table] = hive_source_sql("data" if use_local else bucket, table, repos, lookback_months, filename="snapshot_file")
+        elif use_local:
+            tables[table] = f"SELECT * FROM read_parquet('data/{repos[0]}_{table}*.parquet', filename = 'snapshot_file')"
+        else:
+            tables[table] = f"SELECT * FROM read_parquet('{bucket}/{repo_slug}/{table}*.parquet', filename = 'snapshot_file')"
+
+    snapshot = f"regexp_extract(snapshot_file, '{SNAPSHOT_PATTERN}', 1)"
+    new_snapshots = f"{{{{ if incremental }}}}WHERE {snapshot} > '{{{{ .state.max_snapshot }}}}'{{{{ end }}}}"
+    repo_select = "    c.repo,\n" if repo_column else ""
+    join = "c.repo = f.repo AND c.commit_hash = f.commit_hash" if repo_column else "c.commit_hash = f.commit_hash"
+    change_id = "c.repo || ':' || c.commit_hash" if repo_column else "c.commit_hash"
+    if projection["modified_files"]:
+        modified_files_cte = f""", modified_files AS (
+    SELECT *
+    FROM ({tables['modified_files']})
+    {new_snapshots}
+  )"""
+        join_sql = f"\n  LEFT JOIN modified_files f ON {join}"
+        change_id = f"{change_id} || ':' || coalesce(new_path, old_path, '')"
+    else:
+        modified_files_cte = join_sql = ""
+    secrets = f"create_secrets_from_connectors: {connector}\n" if not use_local else ""
+
+    model_yaml = f"""# Model YAML
+# Reference documentation: https://docs.rilldata.com/reference/project-files/models
+
+type: model
+materialize: true
+incremental: true
+
+connector: duckdb
+{secrets}
+# The newest snapshot in the model; a refresh only reads the files written after it
+state:
+  sql: SELECT coalesce(max(snapshot), '') AS max_snapshot FROM {name}_commits_model
+
+sql: |
+  WITH commits AS (
+    SELECT *, {snapshot} AS snapshot
+    FROM ({tables['commits']})
+    {new_snapshots}
+  ){modified_files_cte}
+  SELECT
+{textwrap.indent(repo_select + model_select(projection), "  ")}      c.snapshot,
+      {change_id} AS change_id,
+  FROM commits c{join_sql}
+  -- A commit can be in several snapshots, keep the newest copy
+  QUALIFY row_number() OVER (PARTITION BY change_id ORDER BY c.snapshot DESC) = 1
+
+# Rows from later snapshots replace earlier copies of the same commit and file change
+output:
+  incremental_strategy: merge
+  unique_key: [change_id]
+"""
+
+    write_model_file(f"models/{name}_commits_model.yaml", model_yaml)
+
+
+def write_model_file(model_path, contents):
+    """Write a model file, removing the model of the same name in the other format."""
     os.makedirs("models", exist_ok=True)
-    model_path = f"models/{name}_commits_model.sql"
+    other = os.path.splitext(model_path)[0] + (".yaml" if model_path.endswith(".sql") else ".sql")
+    if os.path.exists(other):
+        os.remove(other)
+        logger.info(f"Removed {other}")
     with open(model_path, "w") as f:
-        f.write(model_sql)
+        f.write(contents)
     logger.info(f"Created {model_path}")
 
 
-def create_metrics_file(name, display_name):
-    """Generate the metrics view YAML file."""
+def metrics_fields(projection=None):
+    """The dimensions and measures of the metrics view over the model columns that can be computed from the projection."""
+    available = model_columns(projection)
+    dimensions = [dimension for dimension in DIMENSIONS if dimension[2] in available]
+    measures = [measure for measure in MEASURES if set(measure[5]) <= set(available)]
+    return dimensions, measures
+
+
+def create_metrics_file(name, display_name, repo_column=False, projection=None):
+    """Generate the metrics view YAML file, of the dimensions and measures the `projection` downloaded has columns for."""
     
+    dimensions, measures = metrics_fields(projection)
+    if repo_column:
+        dimensions = [("repo", "Repository", "repo", "")] + dimensions
+    dimensions_yaml = "".join(
+        f"""  - name: {dimension}
+    display_name: {dimension_display_name}
+    expression: {expression}
+    description: "{description}"
+""" for dimension, dimension_display_name, expression, description in dimensions
+    )
+    measures_yaml = "".join(
+        f"""  - display_name: "{measure_display_name}"
+    expression: "{expression}"
+    name: {measure}
+    description: "{description}"
+    format_preset: {format_preset}
+""" for measure, measure_display_name, expression, description, format_preset, _ in measures
+    )
     metrics_yaml = f"""# Metrics view YAML
 # Reference documentation: https://docs.rilldata.com/reference/project-files/dashboards
 
@@ -146,55 +409,88 @@ timeseries: date
 smallest_time_grain: "day"
 
 dimensions:
-  - name: commit_hash
-    display_name: Commit hash
-    expression: commit_hash
-    description: ""
-  - name: commit_message
-    display_name: Commit message
-    expression: commit_message
+{dimensions_yaml}
+measures:
+{measures_yaml}"""
+    
+    os.makedirs("metrics", exist_ok=True)
+    metrics_path = f"metrics/{name}_commits_metrics.yaml"
+    with open(metrics_path, "w") as f:
+        f.write(metrics_yaml)
+    logger.info(f"Created {metrics_path}")
+
+
+def create_rollup_files(name, display_name, repo_column=False):
+    """Generate a daily rollup of the model, with its metrics view and explore dashboard.
+
+    The rollup has one row per day, user and directory (and repository), with the sums of the model and,
+    for the distinct counts, the distinct 64-bit hashes of the commits and files. Hash sets merge by
+    union, so the number of distinct commits or files over any days and dimensions is the size of the
+    union of the rows' sets, without reading the model again. The sets are exact, since a row only holds
+    one user's commits in one directory on one day; the README compares them to fixed-size sketches.
+    """
+    repo_select = "    repo,\n" if repo_column else ""
+    rollup_sql = f"""-- Model SQL
+-- Reference documentation: https://docs.rilldata.com/reference/project-files/models
+-- @materialize: true
+
+-- One row per UTC day, user and directory of the commits model
+SELECT
+    date_trunc('day', date) AS date,
+{repo_select}    username,
+    first_directory,
+    second_directory_concat AS second_directory,
+    count(*) AS file_changes,
+    sum(additions) AS additions,
+    sum(deletions) AS deletions,
+    sum(changes) AS changes,
+    -- Mergeable distinct counts: the sets of hashes are unioned at query time
+    list(DISTINCT hash(commit_hash)) AS commit_hashes,
+    list(DISTINCT hash(filename)) FILTER (WHERE filename IS NOT NULL) AS filename_hashes,
+FROM {name}_commits_model
+GROUP BY ALL
+"""
+    write_model_file(f"models/{name}_commits_daily.sql", rollup_sql)
+
+    repo_dimension = """  - name: repo
+    display_name: Repository
+    expression: repo
     description: ""
-  - name: username
+""" if repo_column else ""
+    distinct_commits = "list_unique(flatten(list(commit_hashes)))"
+    metrics_yaml = f"""# Metrics view YAML
+# Reference documentation: https://docs.rilldata.com/reference/project-files/dashboards
+
+version: 1
+type: metrics_view
+
+display_name: {display_name} Daily Commits Metrics
+model: {name}_commits_daily
+timeseries: date
+smallest_time_grain: "day"
+
+dimensions:
+{repo_dimension}  - name: username
     display_name: Username
     expression: username
     description: ""
-  - name: file_path
-    display_name: File path
-    expression: file_path
-    description: ""
-  - name: filename
-    display_name: Filename
-    expression: filename
-    description: ""
-  - name: file_extension
-    display_name: File extension
-    expression: file_extension
-    description: ""
   - name: first_directory
     display_name: First directory
     expression: first_directory
     description: ""
   - name: second_directory
     display_name: Second directory
-    expression: second_directory_concat
+    expression: second_directory
     description: ""
-  - name: previous_file_path
-    display_name: Previous file path
-    expression: previous_file_path
-    description: ""
-  - name: is_merge_commit
-    display_name: Merge commit
-    expression: is_merge_commit
-    description: "True if the commit is a merge commit"
 
 measures:
   - display_name: "Number of commits"
-    expression: "count(distinct commit_hash)"
+    expression: "{distinct_commits}"
     name: count_distinct_commit_hash
     description: ""
     format_preset: humanize
   - display_name: Number of files touched
-    expression: count(distinct filename)
+    expression: list_unique(flatten(list(filename_hashes)))
     name: count_distinct_filename
     description: ""
     format_preset: humanize
@@ -224,29 +520,25 @@ measures:
     description: "The percentage of code changes that were deletions."
     format_preset: percentage
   - display_name: "Files touched per commit"
-    expression: "count(*) / count(distinct commit_hash)"
+    expression: "sum(file_changes) / {distinct_commits}"
     name: count_files_touched_per_commit
     description: ""
     format_preset: humanize
 """
-    
     os.makedirs("metrics", exist_ok=True)
-    metrics_path = f"metrics/{name}_commits_metrics.yaml"
+    metrics_path = f"metrics/{name}_commits_daily_metrics.yaml"
     with open(metrics_path, "w") as f:
         f.write(metrics_yaml)
     logger.info(f"Created {metrics_path}")
 
-
-def create_dashboard_file(name, display_name):
-    """Generate the explore dashboard YAML file."""
-    
+    repo_default = "    - repo\n" if repo_column else ""
     dashboard_yaml = f"""# Explore YAML
 # Reference documentation: https://docs.rilldata.com/reference/project-files/explores
 
 type: explore
 
-display_name: "{display_name} Commits"
-metrics_view: {name}_commits_metrics
+display_name: "{display_name} Commits Overview"
+metrics_view: {name}_commits_daily_metrics
 
 dimensions: "*"
 measures: "*"
@@ -261,17 +553,39 @@ defaults:
     - percent_code_change
     - count_files_touched_per_commit
   dimensions:
-    - commit_hash
-    - commit_message
-    - username
-    - file_path
-    - filename
-    - file_extension
+{repo_default}    - username
     - first_directory
     - second_directory
-    - previous_file_path
-    - is_merge_commit
   time_range: P12M
+"""
+    os.makedirs("dashboards", exist_ok=True)
+    dashboard_path = f"dashboards/{name}_commits_daily_explore.yaml"
+    with open(dashboard_path, "w") as f:
+        f.write(dashboard_yaml)
+    logger.info(f"Created {dashboard_path}")
+
+
+def create_dashboard_file(name, display_name, repo_column=False, projection=None):
+    """Generate the explore dashboard YAML file."""
+    
+    dimensions, measures = metrics_fields(projection)
+    dimension_names = (["repo"] if repo_column else []) + [dimension[0] for dimension in dimensions]
+    default_dimensions = "".join(f"    - {dimension}\n" for dimension in dimension_names)
+    default_measures = "".join(f"    - {measure[0]}\n" for measure in measures)
+    dashboard_yaml = f"""# Explore YAML
+# Reference documentation: https://docs.rilldata.com/reference/project-files/explores
+
+type: explore
+
+display_name: "{display_name} Commits"
+metrics_view: {name}_commits_metrics
+
+dimensions: "*"
+measures: "*"
+defaults:
+  measures:
+{default_measures}  dimensions:
+{default_dimensions}  time_range: P12M
 """
     
     os.makedirs("dashboards", exist_ok=True)
@@ -290,16 +604,37 @@ Examples:
   # For GCS deployment
   python generate_project.py duckdb/duckdb --gcs --bucket gs://my-bucket/github-analytics
   
+  # For S3, or an S3-compatible store such as MinIO
+  python generate_project.py duckdb/duckdb --s3 --bucket s3://my-bucket/github-analytics
+  python generate_project.py duckdb/duckdb --s3 --bucket s3://my-bucket/github-analytics --s3-endpoint-url http://localhost:9000
+  
   # For local testing
   python generate_project.py duckdb/duckdb --local
   
   # With custom display name
   python generate_project.py clickhouse/clickhouse --gcs --bucket gs://my-bucket --display-name "ClickHouse"
+  
+  # One dataset, model and dashboard for several repositories
+  python generate_project.py duckdb/duckdb rilldata/rill clickhouse/clickhouse --local --name github
+  
+  # With a daily rollup and an overview dashboard over it
+  python generate_project.py duckdb/duckdb --local --rollups
+  
+  # For data downloaded with download_commits.py --commits-only or --columns
+  python generate_project.py duckdb/duckdb --local --commits-only
+  python generate_project.py duckdb/duckdb --local --columns author_name,author_date,filename,first_directory
         """
     )
     parser.add_argument(
-        "repo_slug",
-        help="GitHub repository in format 'owner/repo' (e.g., 'duckdb/duckdb')"
+        "repo_slugs",
+        nargs="+",
+        metavar="repo_slug",
+        help="GitHub repository in format 'owner/repo' (e.g., 'duckdb/duckdb'). Several repositories get one "
+             "project over the dataset written by download_commits.py with the same repositories"
+    )
+    parser.add_argument(
+        "--name",
+        help="File prefix of the generated files (default: the repo name, or 'github' with several repositories)"
     )
     parser.add_argument(
         "--local",
@@ -311,31 +646,86 @@ Examples:
         action="store_true",
         help="Use Google Cloud Storage (for deployment)"
     )
+    parser.add_argument(
+        "--s3",
+        action="store_true",
+        help="Use Amazon S3 or an S3-compatible store (for deployment)"
+    )
     parser.add_argument(
         "--bucket",
-        help="GCS bucket path (required with --gcs, e.g., gs://my-bucket/github-analytics)"
+        help="Bucket path (required with --gcs or --s3, e.g., gs://my-bucket/github-analytics or s3://my-bucket/github-analytics)"
+    )
+    parser.add_argument(
+        "--s3-endpoint-url",
+        help="With --s3, the endpoint of an S3-compatible store, e.g. http://localhost:9000 for MinIO"
     )
     parser.add_argument(
         "--display-name",
         help="Display name for the dashboard (default: repo name)"
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Read every snapshot file, for data written by download_commits.py --incremental"
+    )
+    parser.add_argument(
+        "--incremental-model",
+        action="store_true",
+        help="Emit an incremental model that reads the parquet files itself and only processes new snapshots "
+             "on refresh, instead of sources and a model rebuilt from scratch"
+    )
+    parser.add_argument(
+        "--layout",
+        choices=["snapshot", "hive"],
+        help="Layout the data was written with by download_commits.py --layout "
+             "(default: snapshot, or hive with several repositories)"
+    )
+    parser.add_argument(
+        "--lookback-months",
+        type=int,
+        help="With --layout hive, only read the partitions of the last N months"
+    )
+    parser.add_argument(
+        "--rollups",
+        action="store_true",
+        help="Also emit a daily rollup of the model by user and directory, with a metrics view and an overview "
+             "dashboard that query it instead of the model"
+    )
+    parser.add_argument(
+        "--columns",
+        type=lambda value: [column.strip() for column in value.split(",") if column.strip()],
+        help="Comma-separated columns the data was downloaded with by download_commits.py --columns; the model, "
+             "metrics view and dashboard only use those"
+    )
+    parser.add_argument(
+        "--commits-only",
+        action="store_true",
+        help="The data was downloaded with download_commits.py --commits-only, without modified files"
+    )
     
     args = parser.parse_args()
     
     # Validate repo slug format
-    if not re.match(r"^[\w-]+/[\w-]+$", args.repo_slug):
-        logger.error("Invalid repo slug format. Use 'owner/repo' (e.g., 'duckdb/duckdb')")
+    for repo_slug in args.repo_slugs:
+        if not re.match(r"^[\w-]+/[\w-]+$", repo_slug):
+            logger.error(f"Invalid repo slug format: {repo_slug}. Use 'owner/repo' (e.g., 'duckdb/duckdb')")
+            return 1
+    
+    batch = len(args.repo_slugs) > 1
+    layout = args.layout or ("hive" if batch else "snapshot")
+    if batch and layout != "hive":
+        logger.error("Several repositories can only be read from one dataset written with --layout hive")
         return 1
     
     # Validate storage flags
-    storage_flags = sum([args.local, args.gcs])
+    storage_flags = sum([args.local, args.gcs, args.s3])
     
     if storage_flags == 0:
-        logger.error("Must specify storage location: --local or --gcs")
+        logger.error("Must specify storage location: --local, --gcs, or --s3")
         return 1
     
     if storage_flags > 1:
-        logger.error("Cannot specify both --local and --gcs")
+        logger.error("Cannot specify more than one of --local, --gcs, and --s3")
         return 1
     
     # Validate bucket requirement
@@ -343,35 +733,65 @@ Examples:
         logger.error("--bucket is required when using --gcs")
         return 1
     
+    if args.s3 and not (args.bucket or "").startswith("s3://"):
+        logger.error("--bucket is required when using --s3, e.g. --bucket s3://my-bucket/github-analytics")
+        return 1
+    
+    try:
+        projection = resolve_columns(args.columns, args.commits_only)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    
+    missing = [column for column in ROLLUP_COLUMNS if column not in model_columns(projection)]
+    if args.rollups and missing:
+        logger.error(f"--rollups needs the model columns {', '.join(missing)}, which can't be computed from the columns downloaded")
+        return 1
+    
     # Generate sanitized name and display name
-    name = sanitize_name(args.repo_slug)
-    display_name = args.display_name or name.replace("_", " ").title()
+    repo_slug = args.repo_slugs[0]
+    repos = [sanitize_name(slug) for slug in args.repo_slugs]
+    name = args.name or ("github" if batch else repos[0])
+    display_name = args.display_name or ("GitHub" if batch and not args.name else name.replace("_", " ").title())
     
-    logger.info(f"Setting up Rill project for {args.repo_slug}")
+    logger.info(f"Setting up Rill project for {', '.join(args.repo_slugs)}")
     logger.info(f"  File prefix: {name}")
     logger.info(f"  Display name: {display_name}")
-    logger.info(f"  Storage: {'Local files' if args.local else f'GCS ({args.bucket})'}")
+    logger.info(f"  Storage: {'Local files' if args.local else f'S3 ({args.bucket})' if args.s3 else f'GCS ({args.bucket})'}")
     
     # Create all files
-    create_source_files(name, args.repo_slug, args.local, args.bucket)
-    create_model_file(name)
-    create_metrics_file(name, display_name)
-    create_dashboard_file(name, display_name)
+    if args.s3:
+        create_s3_connector_file(args.s3_endpoint_url)
+    if args.incremental_model:
+        create_incremental_model_file(name, repo_slug, args.local, args.bucket, layout, args.lookback_months, repos, projection)
+    else:
+        create_source_files(name, repo_slug, args.local, args.bucket, args.incremental, layout, args.lookback_months, repos, projection)
+        create_model_file(name, repo_column=batch, projection=projection)
+    create_metrics_file(name, display_name, repo_column=batch, projection=projection)
+    create_dashboard_file(name, display_name, repo_column=batch, projection=projection)
+    if args.rollups:
+        create_rollup_files(name, display_name, repo_column=batch)
     
+    slugs = " ".join(args.repo_slugs)
+    # Several repositories are always downloaded with the hive layout
+    layout_flag = " --layout hive" if layout == "hive" and not batch else ""
+    # The data has to be downloaded with the same columns
+    projection_flags = (" --commits-only" if args.commits_only else "") + (f" --columns {','.join(args.columns)}" if args.columns else "")
+    dashboards = f"{name}_commits_daily_explore, or {name}_commits_explore for files and commits" if args.rollups else f"{name}_commits_explore"
     logger.info("✅ Setup complete!")
     logger.info("Next steps:")
     
     if args.local:
         logger.info(f"  1. Download commit data:")
-        logger.info(f"     python download_commits.py {args.repo_slug} --local")
+        logger.info(f"     python download_commits.py {slugs} --local{layout_flag}{projection_flags}")
         logger.info(f"  2. Start Rill: rill start")
-        logger.info(f"  3. Open dashboard: {name}_commits_explore")
+        logger.info(f"  3. Open dashboard: {dashboards}")
     else:
         logger.info(f"  1. Download and upload data:")
-        logger.info(f"     python download_commits.py {args.repo_slug} --gcs \\")
-        logger.info(f"       --bucket {args.bucket}")
+        logger.info(f"     python download_commits.py {slugs} {'--s3' if args.s3 else '--gcs'} \\")
+        logger.info(f"       --bucket {args.bucket}{f' --s3-endpoint-url {args.s3_endpoint_url}' if args.s3_endpoint_url else ''}{' --incremental' if args.incremental else ''}{layout_flag}{projection_flags}")
         logger.info(f"  2. Start Rill: rill start")
-        logger.info(f"  3. Open dashboard: {name}_commits_explore")
+        logger.info(f"  3. Open dashboard: {dashboards}")
         logger.info(f"  4. Deploy: rill deploy")
     
     return 0
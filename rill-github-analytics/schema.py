@@ -0,0 +1,78 @@
+"""
+Columns of the parquet files written by download_commits.py, and which of them a run extracts.
+
+Only the standard library is used here, so generate_project.py can resolve the same projections as
+download_commits.py without its dependencies. The column types are in download_commits.py.
+"""
+
+# Columns of each table, in the order they are written
+COMMITS_COLUMNS = [
+    "commit_hash",
+    "commit_msg",
+    "author_name",
+    "author_email",
+    "author_date",
+    "author_timezone",
+    "merge",
+]
+
+MODIFIED_FILES_COLUMNS = [
+    "commit_hash",
+    "filename",
+    "old_path",
+    "new_path",
+    "added_lines",
+    "deleted_lines",
+    # Derived from filename and new_path by add_path_columns
+    "file_extension",
+    "first_directory",
+    "second_directory",
+    "second_directory_concat",
+]
+
+TABLE_COLUMNS = {"commits": COMMITS_COLUMNS, "modified_files": MODIFIED_FILES_COLUMNS}
+
+# Columns every projection keeps: the keys rows are deduplicated and joined on, and the date runs resume from
+REQUIRED_COLUMNS = {
+    "commits": ["commit_hash", "author_date"],
+    "modified_files": ["commit_hash", "old_path", "new_path"],
+}
+
+# Columns computed by add_path_columns, and the column each one is derived from
+DERIVED_COLUMNS = {
+    "file_extension": "filename",
+    "first_directory": "new_path",
+    "second_directory": "new_path",
+    "second_directory_concat": "new_path",
+}
+
+# Counting lines needs the patch of every modified file, the rest only needs the list of files
+LINE_COLUMNS = ["added_lines", "deleted_lines"]
+
+
+def resolve_columns(columns=None, commits_only=False):
+    """The columns to extract from each table, in schema order, or an empty list for a table that isn't extracted.
+
+    `columns` lists columns of either table (all of them by default), and the modified files table is
+    only extracted if one of its own columns is listed. The REQUIRED_COLUMNS of an extracted table, and
+    the columns derived ones are computed from, are always included. With `commits_only`, modified
+    files are never extracted.
+    """
+    if columns is None:
+        projection = {table: list(names) for table, names in TABLE_COLUMNS.items()}
+    else:
+        unknown = [name for name in columns if name not in COMMITS_COLUMNS + MODIFIED_FILES_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        requested = set(columns) | {DERIVED_COLUMNS[name] for name in columns if name in DERIVED_COLUMNS}
+        projection = {
+            table: [name for name in names if name in requested or name in REQUIRED_COLUMNS[table]]
+            for table, names in TABLE_COLUMNS.items()
+        }
+        if not requested & (set(MODIFIED_FILES_COLUMNS) - set(COMMITS_COLUMNS)):
+            projection["modified_files"] = []
+    if commits_only:
+        if columns is not None and projection["modified_files"]:
+            raise ValueError("Modified files columns can't be extracted with --commits-only")
+        projection["modified_files"] = []
+    return projection
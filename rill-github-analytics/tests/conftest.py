@@ -0,0 +1,62 @@
+"""
+Fixtures shared by the tests: synthetic repositories generated like benchmark_download.py's, and a
+working directory for download_commits() to write its local data/ directory into.
+"""
+
+import glob
+import subprocess
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from benchmark_download import generate_repository
+
+# Columns the rows of each table are ordered by when tables are compared
+ROW_ORDER = {
+    "commits": ["commit_hash"],
+    "modified_files": ["commit_hash", "new_path", "old_path"],
+}
+
+
+@pytest.fixture(scope="session")
+def generated_repository(tmp_path_factory):
+    """A bare repository with merges, renames and deletions, generated once per session."""
+    path = tmp_path_factory.mktemp("generated") / "synthetic.git"
+    generate_repository(path, commits=60, files_per_commit=4, merge_ratio=0.1, rename_rate=0.1, message_size=50, authors=5, seed=1)
+    return path
+
+
+@pytest.fixture
+def repository(generated_repository, tmp_path):
+    """A copy of the generated repository that a test can move branches in."""
+    path = tmp_path / "repository.git"
+    subprocess.run(["git", "clone", "--quiet", "--mirror", str(generated_repository), str(path)], check=True)
+    return path
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """An empty working directory, so local runs write to their own data/ directory."""
+    path = tmp_path / "work"
+    path.mkdir()
+    monkeypatch.chdir(path)
+    return path
+
+
+def repository_url(path):
+    return f"file://{path}"
+
+
+def git(path, *args):
+    """Run a git command in a repository and return its output."""
+    return subprocess.run(["git", "-C", str(path), *args], check=True, capture_output=True, text=True).stdout.strip()
+
+
+def read_rows(table, pattern):
+    """The rows of every parquet file matching `pattern`, as plain values in a stable order."""
+    tables = [pq.read_table(path) for path in sorted(glob.glob(pattern, recursive=True))]
+    if not tables:
+        return []
+    rows = pa.concat_tables(tables, promote_options="permissive").to_pylist()
+    return sorted(rows, key=lambda row: tuple(row[column] or "" for column in ROW_ORDER[table]))
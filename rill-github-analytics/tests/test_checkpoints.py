@@ -0,0 +1,114 @@
+import glob
+import os
+
+import pytest
+
+import download_commits as dc
+from conftest import git, read_rows, repository_url
+
+GLOBS = {
+    "snapshot": {"commits": "data/synthetic_commits_*.parquet", "modified_files": "data/synthetic_modified_files_*.parquet"},
+    "hive": {"commits": "data/commits/repo=synthetic/*/*/*.parquet", "modified_files": "data/modified_files/repo=synthetic/*/*/*.parquet"},
+}
+
+
+def download(repository, workdir, monkeypatch, layout="snapshot", **options):
+    """Download into `workdir` and return the run report and the rows of both tables."""
+    workdir.mkdir(exist_ok=True)
+    monkeypatch.chdir(workdir)
+    report = dc.download_commits(
+        repository_url(repository), "test/synthetic", "synthetic", use_local=True, writer_options=dc.WriterOptions(layout=layout), **options
+    )
+    return report, {table: read_rows(table, pattern) for table, pattern in GLOBS[layout].items()}
+
+
+def interrupt_after_checkpoints(monkeypatch, checkpoints):
+    """Make the next run fail right after it saved `checkpoints` checkpoints."""
+    save = dc.Checkpoint.save
+    saved = []
+
+    def interrupted_save(self, *args):
+        save(self, *args)
+        saved.append(self.state["commits"])
+        if len(saved) == checkpoints:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(dc.Checkpoint, "save", interrupted_save)
+    return saved
+
+
+@pytest.mark.parametrize("layout", ["snapshot", "hive"])
+@pytest.mark.parametrize("backend, pipeline", [("pydriller", False), ("pydriller", True), ("git-log", False)])
+def test_resume_from_a_checkpoint(generated_repository, tmp_path, monkeypatch, layout, backend, pipeline):
+    _, expected = download(generated_repository, tmp_path / "expected", monkeypatch, layout, backend=backend)
+
+    options = {"backend": backend, "pipeline": pipeline, "checkpoint_every": 10}
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        saved = interrupt_after_checkpoints(patch, 2)
+        download(generated_repository, tmp_path / "resumed", monkeypatch, layout, **options)
+    # Nothing the sources read is written until the run completes
+    assert not any(glob.glob(pattern) for pattern in GLOBS[layout].values())
+    assert os.path.exists("data/_staging/synthetic_checkpoint/checkpoint.json")
+
+    report, rows = download(generated_repository, tmp_path / "resumed", monkeypatch, layout, **options)
+
+    assert rows == expected
+    assert report["commits"] == len(expected["commits"]) - saved[-1]
+    assert not os.path.exists("data/_staging/synthetic_checkpoint")
+    manifest = dc.read_manifest("data", "synthetic_")
+    assert sorted(manifest["files"]["commits"]) == sorted(glob.glob(GLOBS[layout]["commits"]))
+
+
+def test_resume_traverses_the_history_the_interrupted_run_started_on(repository, tmp_path, monkeypatch):
+    tip = git(repository, "rev-parse", "main")
+    git(repository, "update-ref", "refs/heads/main", "main~20")
+    _, expected = download(repository, tmp_path / "expected", monkeypatch)
+
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        interrupt_after_checkpoints(patch, 1)
+        download(repository, tmp_path / "resumed", monkeypatch, checkpoint_every=10)
+    git(repository, "update-ref", "refs/heads/main", tip)
+    _, rows = download(repository, tmp_path / "resumed", monkeypatch, checkpoint_every=10)
+
+    assert rows == expected
+
+
+def test_checkpoint_of_other_settings_is_discarded(generated_repository, tmp_path, monkeypatch):
+    _, expected = download(generated_repository, tmp_path / "expected", monkeypatch, traversal=dc.TraversalOptions(no_merges=True))
+
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        interrupt_after_checkpoints(patch, 1)
+        download(generated_repository, tmp_path / "resumed", monkeypatch, checkpoint_every=10)
+    report, rows = download(
+        generated_repository, tmp_path / "resumed", monkeypatch, checkpoint_every=10, traversal=dc.TraversalOptions(no_merges=True)
+    )
+
+    assert rows == expected
+    assert report["commits"] == len(expected["commits"])
+
+
+@pytest.mark.parametrize("layout", ["snapshot", "hive"])
+@pytest.mark.parametrize("options", [{}, {"workers": 2}, {"backend": "git-log"}, {"commits_only": True}])
+def test_pipelined_run_matches_sequential(generated_repository, tmp_path, monkeypatch, layout, options):
+    _, sequential = download(generated_repository, tmp_path / "sequential", monkeypatch, layout, **options)
+    _, pipelined = download(generated_repository, tmp_path / "pipelined", monkeypatch, layout, pipeline=True, **options)
+
+    assert pipelined == sequential
+
+
+def test_pipelined_run_aborts_its_files_when_traversal_fails(generated_repository, workdir, monkeypatch):
+    extract_commits = dc.extract_commits
+
+    def failing_extract_commits(*args, **kwargs):
+        for number, item in enumerate(extract_commits(*args, **kwargs)):
+            if number == 30:
+                raise RuntimeError("traversal failed")
+            yield item
+
+    monkeypatch.setattr(dc, "extract_commits", failing_extract_commits)
+    with pytest.raises(RuntimeError, match="traversal failed"):
+        dc.download_commits(
+            repository_url(generated_repository), "test/synthetic", "synthetic", writer_options=dc.WriterOptions(batch_size=10, row_group_size=10), pipeline=True
+        )
+
+    assert not any(glob.glob(pattern) for pattern in GLOBS["snapshot"].values())
@@ -0,0 +1,208 @@
+import glob
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import compact_snapshots
+from compact_snapshots import compact, compact_files, prune_superseded
+from conftest import git, read_rows, repository_url
+from download_commits import MODIFIED_FILES_SCHEMA, WriterOptions, add_path_columns, download_commits, project_schema
+from schema import MODIFIED_FILES_COLUMNS
+
+SNAPSHOT_GLOBS = {"commits": "data/synthetic_commits_*.parquet", "modified_files": "data/synthetic_modified_files_*.parquet"}
+HIVE_GLOBS = {"commits": "data/commits/repo=synthetic/*/*/*.parquet", "modified_files": "data/modified_files/repo=synthetic/*/*/*.parquet"}
+
+
+def download(repository, **options):
+    return download_commits(repository_url(repository), "test/synthetic", "synthetic", use_local=True, **options)
+
+
+def download_in_two_runs(repository, layout="snapshot"):
+    """A full run over all but the newest 20 commits, then an incremental run adding them as a delta."""
+    tip = git(repository, "rev-parse", "main")
+    git(repository, "update-ref", "refs/heads/main", "main~20")
+    download(repository, writer_options=WriterOptions(layout=layout))
+    git(repository, "update-ref", "refs/heads/main", tip)
+    download(repository, incremental=True, writer_options=WriterOptions(layout=layout))
+
+
+def read_manifest():
+    with open("data/synthetic_manifest.json") as f:
+        return json.load(f)
+
+
+def write_modified_files(path, rows):
+    schema = project_schema(MODIFIED_FILES_SCHEMA, MODIFIED_FILES_COLUMNS)
+    rows = [{"filename": None, "old_path": None, "new_path": None, "deleted_lines": 0, **row} for row in rows]
+    pq.write_table(pa.Table.from_batches([add_path_columns(pa.RecordBatch.from_pylist(rows, schema=schema))]), path)
+
+
+def test_compact_files_keeps_the_newest_row_per_commit_and_path(tmp_path):
+    write_modified_files(tmp_path / "old.parquet", [
+        {"commit_hash": "a", "new_path": "src/x.py", "filename": "x.py", "added_lines": 1},
+        # A deleted file is keyed on its old path
+        {"commit_hash": "a", "old_path": "src/y.py", "filename": "y.py", "added_lines": 2},
+        {"commit_hash": "b", "new_path": "src/x.py", "filename": "x.py", "added_lines": 3},
+    ])
+    write_modified_files(tmp_path / "new.parquet", [
+        {"commit_hash": "a", "new_path": "src/x.py", "filename": "x.py", "added_lines": 10},
+        {"commit_hash": "a", "old_path": "src/y.py", "filename": "y.py", "added_lines": 20},
+        # The same path in another commit isn't a duplicate
+        {"commit_hash": "c", "new_path": "src/x.py", "filename": "x.py", "added_lines": 30},
+    ])
+
+    destination = tmp_path / "compacted.parquet"
+    rows_read, rows_written = compact_files(
+        "modified_files", [str(tmp_path / "old.parquet"), str(tmp_path / "new.parquet")], str(destination)
+    )
+
+    assert (rows_read, rows_written) == (6, 4)
+    rows = read_rows("modified_files", str(destination))
+    assert [(row["commit_hash"], row["new_path"], row["old_path"], row["added_lines"]) for row in rows] == [
+        ("a", None, "src/y.py", 20),
+        ("a", "src/x.py", None, 10),
+        ("b", "src/x.py", None, 3),
+        ("c", "src/x.py", None, 30),
+    ]
+    assert rows[1]["first_directory"] == "src"
+    assert pq.read_schema(destination).metadata[b"compacted_from"] == b"2"
+
+
+@pytest.mark.parametrize("layout, globs", [("snapshot", SNAPSHOT_GLOBS), ("hive", HIVE_GLOBS)])
+def test_compact_merges_the_deltas_of_incremental_runs(repository, workdir, layout, globs):
+    download_in_two_runs(repository, layout)
+    expected = {table: read_rows(table, pattern) for table, pattern in globs.items()}
+    superseded = {table: len(read_manifest()["files"][table]) for table in globs}
+
+    summary = compact("test/synthetic", layout=layout, keep=1)
+
+    manifest = read_manifest()
+    for table, pattern in globs.items():
+        assert read_rows(table, pattern) == expected[table]
+        assert summary[table]["superseded_files"] == superseded[table]
+        assert summary[table]["rows_read"] == summary[table]["rows_written"] == len(expected[table])
+        assert len(manifest["files"][table]) == summary[table]["files"] == 1
+        assert os.path.exists(manifest["files"][table][0])
+    assert manifest["superseded"] == {"commits": [], "modified_files": []}
+    assert "pending_moves" not in manifest
+    assert len(os.listdir("data/_superseded")) == 1
+
+
+def test_compact_drops_the_rows_a_delta_repeats(repository, workdir):
+    download_in_two_runs(repository)
+    expected = read_rows("commits", SNAPSHOT_GLOBS["commits"])
+    # A delta that repeats rows of the base snapshot, e.g. written again after a failed manifest update
+    manifest = read_manifest()
+    base = manifest["files"]["commits"][0]
+    repeated_rows = len(read_rows("commits", base))
+    repeated = "data/synthetic_commits_20000101000000.parquet"
+    shutil.copy(base, repeated)
+    manifest["files"]["commits"].insert(0, repeated)
+    with open("data/synthetic_manifest.json", "w") as f:
+        json.dump(manifest, f)
+
+    summary = compact("test/synthetic")
+
+    assert summary["commits"]["rows_read"] - summary["commits"]["rows_written"] == repeated_rows
+    assert read_rows("commits", SNAPSHOT_GLOBS["commits"]) == expected
+
+
+def test_compact_only_moves_files_the_manifest_lists(repository, workdir):
+    download_in_two_runs(repository)
+    listed = read_manifest()["files"]["commits"]
+    unlisted = "data/synthetic_commits_20000101000000.parquet"
+    shutil.copy(listed[0], unlisted)
+
+    summary = compact("test/synthetic")
+
+    assert summary["commits"]["unlisted_files"] == 1
+    assert summary["commits"]["superseded_files"] == len(listed)
+    assert os.path.exists(unlisted)
+    assert unlisted not in read_manifest()["files"]["commits"]
+    assert not glob.glob(f"data/_superseded/*/{os.path.basename(unlisted)}")
+
+
+def test_compact_archives_the_snapshots_a_full_run_replaced(repository, workdir):
+    download(repository)
+    replaced = read_manifest()["files"]
+    download(repository)
+
+    summary = compact("test/synthetic")
+
+    assert summary["commits"]["superseded_files"] == summary["modified_files"]["superseded_files"] == 1
+    assert not any(os.path.exists(path) for paths in replaced.values() for path in paths)
+    archived = [os.path.basename(path) for path in glob.glob("data/_superseded/*/*.parquet")]
+    assert sorted(archived) == sorted(os.path.basename(path) for paths in replaced.values() for path in paths)
+
+
+# Two files are moved into place, then four into the archive
+@pytest.mark.parametrize("moves_made", [None, 0, 1, 2, 5])
+def test_compact_again_after_an_interruption(repository, workdir, monkeypatch, moves_made):
+    download_in_two_runs(repository)
+    expected = {table: read_rows(table, pattern) for table, pattern in SNAPSHOT_GLOBS.items()}
+
+    # Interrupt the run while it writes the compacted files, or once it made some of its moves
+    moves = []
+    move = compact_snapshots.move
+
+    def interrupted_move(path, destination):
+        if len(moves) == moves_made:
+            raise KeyboardInterrupt
+        moves.append(path)
+        move(path, destination)
+
+    def interrupted_compaction(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as patch, pytest.raises(KeyboardInterrupt):
+        if moves_made is None:
+            patch.setattr(compact_snapshots, "compact_files", interrupted_compaction)
+        else:
+            patch.setattr(compact_snapshots, "move", interrupted_move)
+        compact("test/synthetic")
+
+    compact("test/synthetic")
+
+    manifest = read_manifest()
+    for table, pattern in SNAPSHOT_GLOBS.items():
+        assert read_rows(table, pattern) == expected[table]
+        assert len(manifest["files"][table]) == 1
+        assert os.path.exists(manifest["files"][table][0])
+    assert "pending_moves" not in manifest
+    assert not os.path.exists("data/_staging/synthetic_compact")
+    assert len(glob.glob("data/_superseded/*/*.parquet")) == 4
+
+
+def make_superseded(ages_in_days):
+    now = datetime.now()
+    for age in ages_in_days:
+        timestamp = (now - timedelta(days=age)).strftime("%Y%m%d%H%M%S")
+        os.makedirs(f"data/_superseded/synthetic_{timestamp}")
+        open(f"data/_superseded/synthetic_{timestamp}/synthetic_commits_{timestamp}.parquet", "w").close()
+    # Another repository's superseded files are never pruned
+    os.makedirs("data/_superseded/other_20000101000000", exist_ok=True)
+
+
+@pytest.mark.parametrize("keep, keep_days, remaining", [
+    (1, None, 1),
+    (0, None, 0),
+    (3, None, 3),
+    (0, 10, 2),
+    (1, 0.5, 1),
+])
+def test_prune_superseded(workdir, keep, keep_days, remaining):
+    make_superseded([1, 5, 20, 40])
+
+    pruned = prune_superseded("data", "synthetic_", keep, keep_days)
+
+    generations = sorted(name for name in os.listdir("data/_superseded") if name.startswith("synthetic_"))
+    assert len(generations) == remaining
+    assert len(pruned) == 4 - remaining
+    assert os.path.exists("data/_superseded/other_20000101000000")
+    # The newest generations are the ones kept
+    assert all(os.path.basename(path) < min(generations, default="~") for path in pruned)
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from conftest import git, read_rows, repository_url
+from download_commits import TraversalOptions, download_commits, evict_mirrors, mirror_path
+
+GLOBS = {"commits": "data/synthetic_commits_*.parquet", "modified_files": "data/synthetic_modified_files_*.parquet"}
+
+
+def download(repository, workdir, monkeypatch, **options):
+    """Download into `workdir` and return the rows of both tables."""
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    download_commits(repository_url(repository), "test/synthetic", "synthetic", use_local=True, **options)
+    return {table: read_rows(table, pattern) for table, pattern in GLOBS.items()}
+
+
+@pytest.mark.parametrize("traversal", [
+    TraversalOptions(),
+    TraversalOptions(limit=10),
+    TraversalOptions(since="2020-01-02"),
+    TraversalOptions(until="2020-01-02"),
+    TraversalOptions(first_parent=True),
+    TraversalOptions(no_merges=True),
+    TraversalOptions(include_paths=["src"]),
+    TraversalOptions(exclude_paths=["docs", "*.md"]),
+    TraversalOptions(branch="side"),
+], ids=lambda traversal: ",".join(f"{key}={value}" for key, value in traversal.filters().items() if value) or "all")
+def test_git_log_backend_matches_pydriller(generated_repository, tmp_path, monkeypatch, traversal):
+    pydriller = download(generated_repository, tmp_path / "pydriller", monkeypatch, traversal=traversal)
+    git_log = download(generated_repository, tmp_path / "git-log", monkeypatch, traversal=traversal, backend="git-log")
+
+    assert pydriller["commits"]
+    assert git_log == pydriller
+
+
+@pytest.mark.parametrize("options", [
+    {"workers": 2},
+    {"columns": ["author_name", "added_lines"]},
+    {"columns": ["filename"]},
+    {"commits_only": True},
+])
+def test_git_log_backend_matches_pydriller_projections(generated_repository, tmp_path, monkeypatch, options):
+    pydriller = download(generated_repository, tmp_path / "pydriller", monkeypatch, **options)
+    git_log = download(generated_repository, tmp_path / "git-log", monkeypatch, backend="git-log", **options)
+
+    assert git_log == pydriller
+
+
+def test_mirror_cache_fetches_new_commits(repository, workdir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    tip = git(repository, "rev-parse", "main")
+    git(repository, "update-ref", "refs/heads/main", "main~20")
+
+    first = download_commits(repository_url(repository), "test/synthetic", "synthetic", cache_dir=cache_dir)
+    mirror = mirror_path(cache_dir, "test/synthetic")
+    fetched = git(repository, "rev-parse", "main")
+    assert git(mirror, "rev-parse", "main") == fetched
+
+    git(repository, "update-ref", "refs/heads/main", tip)
+    second = download_commits(repository_url(repository), "test/synthetic", "synthetic", cache_dir=cache_dir, incremental=True)
+
+    assert git(mirror, "rev-parse", "main") == tip
+    assert second["commits"] == int(git(repository, "rev-list", "--count", f"{fetched}..{tip}"))
+    assert first["commits"] + second["commits"] == len(read_rows("commits", GLOBS["commits"]))
+    # A force-pushed branch is followed too
+    git(repository, "update-ref", "refs/heads/main", "main~5")
+    download_commits(repository_url(repository), "test/synthetic", "synthetic", cache_dir=cache_dir)
+    assert git(mirror, "rev-parse", "main") == git(repository, "rev-parse", "main")
+
+
+def test_evict_mirrors_drops_the_least_recently_used(repository, tmp_path):
+    cache_dir = tmp_path / "cache"
+    for age, slug in enumerate(["test/newest", "test/middle", "test/oldest"]):
+        path = mirror_path(cache_dir, slug)
+        git(tmp_path, "clone", "--quiet", "--bare", str(repository), str(path))
+        os.utime(path, (1_000_000_000 - age, 1_000_000_000 - age))
+    size = sum(f.stat().st_size for f in mirror_path(cache_dir, "test/newest").rglob("*") if f.is_file())
+
+    # The oldest mirror is kept anyway when it is the one in use
+    evict_mirrors(cache_dir, 2.5 * size, keep=mirror_path(cache_dir, "test/oldest"))
+
+    assert sorted(path.name for path in cache_dir.iterdir()) == ["test__newest.git", "test__oldest.git"]
@@ -10,7 +10,7 @@ SELECT
   RECIPIENTS.RECIPIENTNAME AS recipient_name,
    CAST(
     CASE 
-      WHEN TOTALOFFERINGAMOUNT == 'Indefinite' THEN 0
+      WHEN TOTALOFFERINGAMOUNT == 'Indefinite' THEN '0'
       ELSE TOTALOFFERINGAMOUNT 
      END
     AS BIGINT) AS TotalOfferingAmount, 
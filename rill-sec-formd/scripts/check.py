@@ -1,44 +1,222 @@
-from google.cloud import storage
+"""
+Check that OVER100RECIPIENTFLAG is a boolean column in every OFFERING.tsv of the SEC Form D
+bucket, and rewrite the files where it isn't.
+
+Usage:
+    python check.py [--bucket BUCKET] [--prefix PREFIX] [--workers N] [--dry-run]
+    python check.py --local DIR [--workers N] [--dry-run]
+    python check.py --manifest check_manifest.json [--full]
+
+Files are checked on a pool of worker threads. Each file is streamed in chunks of rows, converted
+chunk by chunk and written to a temporary file, which is only uploaded if a value had to change,
+so memory is bounded by the chunk size times the number of workers.
+
+The generation, etag and md5 of every file are kept in a manifest with the result of its check.
+Files that passed and haven't changed since are skipped, so a run only downloads new or modified
+files; --full checks every file again.
+
+--local checks a directory laid out like the bucket instead. To check a GCS emulator such as
+fake-gcs-server, set STORAGE_EMULATOR_HOST.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
-import io
-
-# Initialize Google Cloud Storage client
-client = storage.Client()
-bucket_name = "medriscoll-rill"
-prefix = "sec-form-d/"
-bucket = client.bucket(bucket_name)
-
-# List files in the bucket
-blobs = bucket.list_blobs(prefix=prefix)
-
-# Function to check and enforce column type for OVER100RECIPIENTFLAG
-def enforce_boolean_column(blob):
-    # Download the file as bytes and read it into a pandas dataframe
-    content = blob.download_as_bytes()
-    df = pd.read_csv(io.BytesIO(content), sep='\t')
-    
-    # Check if the column exists
-    if 'OVER100RECIPIENTFLAG' in df.columns:
-        col_type = df['OVER100RECIPIENTFLAG'].dtype
-        # Convert to BOOLEAN (0/1 or True/False) if it's not already BOOLEAN
-        if col_type != 'bool':
-            print(f"File {blob.name} has OVER100RECIPIENTFLAG as {col_type}. Converting to BOOLEAN.")
-            # Convert VARCHAR or other types to BOOLEAN based on the values
-            df['OVER100RECIPIENTFLAG'] = df['OVER100RECIPIENTFLAG'].apply(
-                lambda x: True if str(x).strip().lower() in ['true', '1', 'yes'] else False
-            )
-            
-            # Write the updated DataFrame back to GCS
-            new_blob = bucket.blob(blob.name)
-            new_content = df.to_csv(sep='\t', index=False)
-            new_blob.upload_from_string(new_content)
-            print(f"File {blob.name} has been updated with BOOLEAN type.")
-        else:
-            print(f"File {blob.name} already has OVER100RECIPIENTFLAG as BOOLEAN.")
-    else:
-        print(f"File {blob.name} does not contain the column OVER100RECIPIENTFLAG.")
-
-# Iterate through the files and check each one
-for blob in blobs:
-    if blob.name.endswith('OFFERING.tsv'):
-        enforce_boolean_column(blob)
+
+FLAG_COLUMN = "OVER100RECIPIENTFLAG"
+# Values DuckDB and pandas read as booleans; files with any other value are rewritten
+BOOLEAN_VALUES = ["True", "False", "TRUE", "FALSE", "true", "false"]
+TRUE_VALUES = ["true", "1", "yes"]
+# Results of a check after which a file doesn't need checking again until it changes
+PASSED = ["ok", "converted"]
+
+
+class LocalBlob:
+    """A file in a local directory, with the parts of the GCS Blob API used here."""
+
+    def __init__(self, root, name):
+        self.root = root
+        self.name = name
+        self.reload()
+
+    def reload(self):
+        # The modification time stands in for the generation, changing whenever the file is written
+        path = os.path.join(self.root, self.name)
+        self.generation = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        self.etag = None
+        self.md5_hash = None
+
+    def open(self, mode="rb"):
+        return open(os.path.join(self.root, self.name), mode)
+
+    def upload_from_filename(self, filename, **kwargs):
+        path = os.path.join(self.root, self.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(filename, path)
+        self.reload()
+
+
+class LocalBucket:
+    """A local directory laid out like the bucket, with the parts of the GCS Bucket API used here."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def list_blobs(self, prefix=""):
+        for directory, _, files in os.walk(self.root):
+            for file in sorted(files):
+                name = os.path.relpath(os.path.join(directory, file), self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    yield LocalBlob(self.root, name)
+
+    def blob(self, name):
+        return LocalBlob(self.root, name)
+
+
+def get_bucket(bucket_name, local_dir=None):
+    """The GCS bucket, or the local directory standing in for it."""
+    if local_dir:
+        return LocalBucket(local_dir)
+    from google.cloud import storage
+
+    return storage.Client().bucket(bucket_name)
+
+
+def blob_version(blob):
+    """What identifies the content of a blob, as listed in the bucket."""
+    return {"generation": blob.generation, "etag": blob.etag, "md5": blob.md5_hash}
+
+
+def read_manifest(path):
+    """The versions and results of the files checked before, by name."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(path, manifest):
+    """Write the manifest atomically, so an interrupted run keeps the previous one."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def enforce_boolean_column(bucket, blob, chunk_size=100_000, dry_run=False):
+    """Check the OVER100RECIPIENTFLAG column of one file, and rewrite the file if it isn't boolean.
+
+    Returns the status of the file, the number of values that weren't booleans and the version of the
+    file after the check.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".tsv")
+    try:
+        invalid = 0
+        with os.fdopen(fd, "w", newline="") as out, blob.open("rb") as f:
+            # Read every column as text, so the other columns are written back unchanged
+            reader = pd.read_csv(f, sep="\t", dtype=str, keep_default_na=False, chunksize=chunk_size)
+            with reader:
+                for i, chunk in enumerate(reader):
+                    if FLAG_COLUMN not in chunk.columns:
+                        return "missing column", 0, blob_version(blob)
+                    values = chunk[FLAG_COLUMN].str.strip()
+                    invalid += int((~values.isin(BOOLEAN_VALUES)).sum())
+                    chunk[FLAG_COLUMN] = values.str.lower().isin(TRUE_VALUES)
+                    if not dry_run:
+                        chunk.to_csv(out, sep="\t", index=False, header=i == 0)
+        if not invalid:
+            return "ok", 0, blob_version(blob)
+        if dry_run:
+            return "would convert", invalid, blob_version(blob)
+        # Don't overwrite the file if it changed since it was read
+        new_blob = bucket.blob(blob.name)
+        new_blob.upload_from_filename(
+            tmp_path, content_type="text/tab-separated-values", if_generation_match=blob.generation
+        )
+        return "converted", invalid, blob_version(new_blob)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def is_unchanged(blob, entry):
+    """Whether a file passed its last check and hasn't changed since."""
+    return entry is not None and entry["status"] in PASSED and entry["version"] == blob_version(blob)
+
+
+def check_files(bucket, prefix, workers=8, chunk_size=100_000, dry_run=False, manifest=None):
+    """Check every OFFERING.tsv under the prefix on a pool of workers, yielding (name, status, invalid values, version).
+
+    Files that passed their check in `manifest` and haven't changed since are skipped, and yielded with
+    the status "unchanged".
+    """
+    manifest = manifest or {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for blob in bucket.list_blobs(prefix=prefix):
+            if not blob.name.endswith("OFFERING.tsv"):
+                continue
+            if is_unchanged(blob, manifest.get(blob.name)):
+                yield blob.name, "unchanged", 0, blob_version(blob)
+                continue
+            futures[executor.submit(enforce_boolean_column, bucket, blob, chunk_size, dry_run)] = blob
+        for future in as_completed(futures):
+            blob = futures[future]
+            try:
+                status, invalid, version = future.result()
+            except Exception as e:
+                status, invalid, version = f"failed: {e}", 0, blob_version(blob)
+            yield blob.name, status, invalid, version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and fix the OVER100RECIPIENTFLAG column of the SEC Form D files")
+    parser.add_argument("--bucket", default="medriscoll-rill", help="GCS bucket (default: medriscoll-rill)")
+    parser.add_argument("--prefix", default="sec-form-d/", help="Prefix of the files (default: sec-form-d/)")
+    parser.add_argument("--local", metavar="DIR", help="Check a local directory laid out like the bucket instead")
+    parser.add_argument("--workers", type=int, default=8, help="Files checked at once (default: 8)")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Rows parsed at a time per file (default: 100000)")
+    parser.add_argument("--dry-run", action="store_true", help="Report the files that need converting without rewriting them")
+    parser.add_argument(
+        "--manifest",
+        default="check_manifest.json",
+        help="Manifest of the files checked, to skip those that passed and haven't changed (default: check_manifest.json)",
+    )
+    parser.add_argument("--full", action="store_true", help="Check every file, even those unchanged since they passed")
+    args = parser.parse_args()
+
+    bucket = get_bucket(args.bucket, args.local)
+    manifest = read_manifest(args.manifest)
+    previous = {} if args.full else dict(manifest)
+    failed = unchanged = 0
+    try:
+        for name, status, invalid, version in check_files(
+            bucket, args.prefix, args.workers, args.chunk_size, args.dry_run, previous
+        ):
+            if status == "unchanged":
+                unchanged += 1
+                continue
+            manifest[name] = {"status": status, "invalid": invalid, "version": version}
+            if status.startswith("failed"):
+                failed += 1
+            detail = f" ({invalid} non-boolean values)" if invalid else ""
+            print(f"File {name}: {status}{detail}")
+    finally:
+        # Keep the results of the files checked so far, even if the run is interrupted
+        write_manifest(args.manifest, manifest)
+
+    print(f"{unchanged} unchanged files skipped")
+    if failed:
+        print(f"{failed} files failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Convert the SEC Form D TSV files in the bucket to Parquet with a fixed schema, for the Rill sources.
+
+Usage:
+    python convert.py [--bucket BUCKET] [--prefix PREFIX] [--output-prefix PREFIX] [--workers N]
+    python convert.py --local DIR [--workers N]
+
+Each quarter's ISSUERS, OFFERING, RECIPIENTS, RELATEDPERSONS and SIGNATURES file is written once to
+{output-prefix}{TABLE}/quarter={YYYY}Q{N}/{TABLE}.parquet, sorted on ACCESSIONNUMBER. Every column
+is read as text, except those in COLUMN_TYPES, so a column has the same type in every quarter instead
+of whatever its values happen to look like.
+
+The files are found and tracked like in check.py: the version of every TSV converted is kept in a
+manifest, and only new or changed files are converted again; --full converts every file.
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from check import FLAG_COLUMN, TRUE_VALUES, blob_version, get_bucket, read_manifest, write_manifest
+
+TABLES = ["ISSUERS", "OFFERING", "RECIPIENTS", "RELATEDPERSONS", "SIGNATURES"]
+SORT_COLUMN = "ACCESSIONNUMBER"
+# The quarter directories, e.g. 2020Q1 or 2020q1_d, and the table of a file in one
+FILE_PATTERN = re.compile(r"(?:^|/)(20[12]\d)[Qq]([1-4])[^/]*/([A-Z]+)\.tsv$")
+
+# Columns that aren't text, in any table, with the type DuckDB reads them as from the TSV files.
+# TOTALOFFERINGAMOUNT and TOTALREMAINING stay text, since they can be 'Indefinite'.
+COLUMN_TYPES = {
+    "SALE_DATE": pa.date32(),
+    FLAG_COLUMN: pa.bool_(),
+    "MINIMUMINVESTMENTACCEPTED": pa.float64(),
+    "TOTALAMOUNTSOLD": pa.float64(),
+    "TOTALNUMBERALREADYINVESTED": pa.int64(),
+    "NUMBERNONACCREDITEDINVESTORS": pa.int64(),
+    "SALESCOMM_DOLLARAMOUNT": pa.float64(),
+    "FINDERSFEE_DOLLARAMOUNT": pa.float64(),
+    "GROSSPROCEEDSUSED_DOLLARAMOUNT": pa.float64(),
+    "ISEQUITYTYPE": pa.bool_(),
+    "ISDEBTTYPE": pa.bool_(),
+    "ISOPTIONTOACQUIRETYPE": pa.bool_(),
+    "ISSECURITYTOBEACQUIREDTYPE": pa.bool_(),
+    "ISPOOLEDINVESTMENTFUNDTYPE": pa.bool_(),
+    "ISTENANTINCOMMONTYPE": pa.bool_(),
+    "ISMINERALPROPERTYTYPE": pa.bool_(),
+    "ISOTHERTYPE": pa.bool_(),
+    "ISBUSINESSCOMBINATIONTRANS": pa.bool_(),
+    "HASNONACCREDITEDINVESTORS": pa.bool_(),
+}
+
+# The numbers DuckDB reads as a BIGINT (True) or DOUBLE (False); anything else is null. Integers are
+# limited to 18 digits so they always fit an int64.
+NUMBER_PATTERNS = {
+    True: r"^[+-]?\d{1,18}$",
+    False: r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$",
+}
+
+
+def output_name(output_prefix, table, year, quarter):
+    """Path of the Parquet file of one table and quarter."""
+    return f"{output_prefix}{table}/quarter={year}Q{quarter}/{table}.parquet"
+
+
+def cast_column(values, type):
+    """Cast a text column to its type, returning the column and how many values couldn't be cast.
+
+    Blank values are null, like when DuckDB reads the TSV files, and so are values that aren't a valid
+    date or number, instead of failing the whole file. Booleans are true for the same values as in check.py.
+    """
+    values = pc.utf8_trim_whitespace(values)
+    values = pc.if_else(pc.equal(values, ""), pa.scalar(None, pa.string()), values)
+    if pa.types.is_boolean(type):
+        cast = pc.is_in(pc.utf8_lower(values), value_set=pa.array(TRUE_VALUES))
+        return pc.if_else(pc.is_null(values), None, cast), 0
+    if pa.types.is_date(type):
+        cast = pc.strptime(values, format="%Y-%m-%d", unit="s", error_is_null=True)
+        # strptime rolls days past the end of the month over to the next one, DuckDB doesn't
+        cast = pc.if_else(pc.equal(pc.strftime(cast, format="%Y-%m-%d"), values), cast, None).cast(type)
+    else:
+        valid = pc.match_substring_regex(values, NUMBER_PATTERNS[pa.types.is_integer(type)])
+        cast = pc.cast(pc.if_else(valid, values, pa.scalar(None, pa.string())), type)
+    return cast, cast.null_count - values.null_count
+
+
+def read_table(blob):
+    """Read a TSV file, every column as text except those in COLUMN_TYPES.
+
+    Returns the table and the number of values of each typed column that couldn't be cast, and are null.
+    """
+    with blob.open("rb") as f:
+        names = f.readline().decode("utf-8").rstrip("\r\n").split("\t")
+        table = pacsv.read_csv(
+            f,
+            read_options=pacsv.ReadOptions(column_names=names),
+            parse_options=pacsv.ParseOptions(delimiter="\t", newlines_in_values=True),
+            # Blank fields are null, like when DuckDB reads the TSV files
+            convert_options=pacsv.ConvertOptions(
+                column_types={name: pa.string() for name in names}, null_values=[""], strings_can_be_null=True
+            ),
+        )
+    nulled = {}
+    for name in names:
+        if name in COLUMN_TYPES:
+            values, nulled[name] = cast_column(table[name], COLUMN_TYPES[name])
+            table = table.set_column(table.schema.get_field_index(name), name, values)
+    return table, {name: count for name, count in nulled.items() if count}
+
+
+def convert_file(bucket, blob, output):
+    """Convert one TSV file to Parquet sorted on ACCESSIONNUMBER.
+
+    Returns its number of rows, and the number of values of each column that were nulled because they
+    couldn't be cast.
+    """
+    table, nulled = read_table(blob)
+    if SORT_COLUMN not in table.column_names:
+        raise ValueError(f"{blob.name} has no {SORT_COLUMN} column")
+    table = table.sort_by(SORT_COLUMN)
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".parquet")
+    os.close(fd)
+    try:
+        pq.write_table(
+            table,
+            tmp_path,
+            compression="zstd",
+            sorting_columns=[pq.SortingColumn(table.schema.get_field_index(SORT_COLUMN))],
+        )
+        bucket.blob(output).upload_from_filename(tmp_path, content_type="application/vnd.apache.parquet")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return table.num_rows, nulled
+
+
+def convert_files(bucket, prefix, output_prefix, workers=8, manifest=None):
+    """Convert the TSV files of every quarter on a pool of workers, yielding (name, status, rows, nulled, version, output).
+
+    Files converted in `manifest` that haven't changed since are skipped, and yielded with the status
+    "unchanged".
+    """
+    manifest = manifest or {}
+    outputs = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for blob in bucket.list_blobs(prefix=prefix):
+            match = FILE_PATTERN.search(blob.name)
+            if not match or match.group(3) not in TABLES:
+                continue
+            year, quarter, table = match.groups()
+            output = output_name(output_prefix, table, year, quarter)
+            if output in outputs:
+                raise ValueError(f"{blob.name} and {outputs[output]} are both {table} of {year}Q{quarter}")
+            outputs[output] = blob.name
+
+            entry = manifest.get(blob.name)
+            if entry and entry["status"] == "converted" and entry["version"] == blob_version(blob):
+                yield blob.name, "unchanged", entry["rows"], entry.get("nulled", {}), entry["version"], output
+                continue
+            futures[executor.submit(convert_file, bucket, blob, output)] = blob, output
+        for future in as_completed(futures):
+            blob, output = futures[future]
+            try:
+                status, (rows, nulled) = "converted", future.result()
+            except Exception as e:
+                status, rows, nulled = f"failed: {e}", 0, {}
+            yield blob.name, status, rows, nulled, blob_version(blob), output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the SEC Form D TSV files to partitioned Parquet")
+    parser.add_argument("--bucket", default="medriscoll-rill", help="GCS bucket (default: medriscoll-rill)")
+    parser.add_argument("--prefix", default="sec-form-d/", help="Prefix of the TSV files (default: sec-form-d/)")
+    parser.add_argument(
+        "--output-prefix",
+        default="sec-form-d-parquet/",
+        help="Prefix the Parquet files are written under, in the same bucket (default: sec-form-d-parquet/)",
+    )
+    parser.add_argument("--local", metavar="DIR", help="Convert the files of a local directory laid out like the bucket instead")
+    parser.add_argument("--workers", type=int, default=8, help="Files converted at once (default: 8)")
+    parser.add_argument(
+        "--manifest",
+        default="convert_manifest.json",
+        help="Manifest of the files converted, to skip those that haven't changed (default: convert_manifest.json)",
+    )
+    parser.add_argument("--full", action="store_true", help="Convert every file, even those unchanged since they were converted")
+    args = parser.parse_args()
+
+    bucket = get_bucket(args.bucket, args.local)
+    manifest = read_manifest(args.manifest)
+    previous = {} if args.full else dict(manifest)
+    failed = unchanged = 0
+    try:
+        for name, status, rows, nulled, version, output in convert_files(
+            bucket, args.prefix, args.output_prefix, args.workers, previous
+        ):
+            if status == "unchanged":
+                unchanged += 1
+                continue
+            manifest[name] = {"status": status, "rows": rows, "nulled": nulled, "version": version, "output": output}
+            if status.startswith("failed"):
+                failed += 1
+                print(f"File {name}: {status}")
+            else:
+                print(f"File {name}: {status} to {output} ({rows} rows)")
+                for column, count in nulled.items():
+                    print(f"  {count} values of {column} couldn't be cast and are null")
+    finally:
+        # Keep the results of the files converted so far, even if the run is interrupted
+        write_manifest(args.manifest, manifest)
+
+    print(f"{unchanged} unchanged files skipped")
+    if failed:
+        print(f"{failed} files failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import json
+import sys
+
+import pytest
+
+import check
+from check import LocalBucket, check_files, enforce_boolean_column
+
+HEADER = "ACCESSIONNUMBER\tOVER100RECIPIENTFLAG\tTOTALOFFERINGAMOUNT\tSALE_DATE\n"
+
+
+def write(root, name, text):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def offering(*rows):
+    return HEADER + "".join("\t".join(row) + "\n" for row in rows)
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    root = tmp_path / "bucket"
+    write(root, "sec-form-d/2020Q1/OFFERING.tsv", offering(
+        ("0001", "Y", "007", "2020-01-01"),
+        ("0002", "N", "Indefinite", ""),
+        ("0003", "true", "1.50", "2020-02-30"),
+        ("0004", " yes ", "", "2020-03-01"),
+        ("0005", "", "10", "2020-03-02"),
+    ))
+    write(root, "sec-form-d/2020Q2/OFFERING.tsv", offering(("0006", "True", "5", "2020-04-01"), ("0007", "false", "6", "2020-04-02")))
+    # Only the OFFERING files have the flag
+    write(root, "sec-form-d/2020Q1/ISSUERS.tsv", "ACCESSIONNUMBER\tENTITYNAME\n0001\tAcme\n")
+    return LocalBucket(str(root))
+
+
+def blob(bucket, name):
+    return bucket.blob(f"sec-form-d/{name}/OFFERING.tsv")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100_000])
+def test_non_boolean_flags_are_converted(bucket, chunk_size):
+    status, invalid, version = enforce_boolean_column(bucket, blob(bucket, "2020Q1"), chunk_size=chunk_size)
+
+    assert (status, invalid) == ("converted", 4)
+    assert version == check.blob_version(blob(bucket, "2020Q1"))
+    # The flag is rewritten, the header once and every other column as it was, leading zeros and blanks included
+    with blob(bucket, "2020Q1").open("r") as f:
+        assert f.read() == offering(
+            ("0001", "False", "007", "2020-01-01"),
+            ("0002", "False", "Indefinite", ""),
+            ("0003", "True", "1.50", "2020-02-30"),
+            ("0004", "True", "", "2020-03-01"),
+            ("0005", "False", "10", "2020-03-02"),
+        )
+    assert enforce_boolean_column(bucket, blob(bucket, "2020Q1"), chunk_size=chunk_size)[:2] == ("ok", 0)
+
+
+def test_boolean_files_are_left_as_they_are(bucket):
+    before = blob(bucket, "2020Q2")
+    with before.open("rb") as f:
+        content = f.read()
+
+    assert enforce_boolean_column(bucket, before) == ("ok", 0, check.blob_version(before))
+    with blob(bucket, "2020Q2").open("rb") as f:
+        assert f.read() == content
+    assert blob(bucket, "2020Q2").generation == before.generation
+
+
+def test_dry_run_reports_without_rewriting(bucket):
+    before = blob(bucket, "2020Q1")
+
+    assert enforce_boolean_column(bucket, before, dry_run=True)[:2] == ("would convert", 4)
+    assert blob(bucket, "2020Q1").generation == before.generation
+
+
+def test_missing_column(tmp_path):
+    bucket = LocalBucket(str(tmp_path))
+    write(tmp_path, "sec-form-d/2020Q3/OFFERING.tsv", "ACCESSIONNUMBER\n0001\n")
+
+    assert enforce_boolean_column(bucket, bucket.blob("sec-form-d/2020Q3/OFFERING.tsv"))[:2] == ("missing column", 0)
+
+
+def test_check_files_only_checks_offerings_that_changed(bucket, tmp_path):
+    results = {name: (status, invalid) for name, status, invalid, _ in check_files(bucket, "sec-form-d/", workers=2)}
+    assert results == {
+        "sec-form-d/2020Q1/OFFERING.tsv": ("converted", 4),
+        "sec-form-d/2020Q2/OFFERING.tsv": ("ok", 0),
+    }
+
+    manifest = {
+        name: {"status": status, "invalid": invalid, "version": version}
+        for name, status, invalid, version in check_files(bucket, "sec-form-d/", workers=2)
+    }
+    assert {name: entry["status"] for name, entry in manifest.items()} == dict.fromkeys(results, "ok")
+
+    # A file written since its check is checked again, the others are skipped
+    write(tmp_path / "bucket", "sec-form-d/2020Q2/OFFERING.tsv", offering(("0006", "1", "5", "2020-04-01")))
+    results = {name: status for name, status, _, _ in check_files(bucket, "sec-form-d/", workers=2, manifest=manifest)}
+    assert results == {"sec-form-d/2020Q1/OFFERING.tsv": "unchanged", "sec-form-d/2020Q2/OFFERING.tsv": "converted"}
+
+
+def test_failed_checks_are_checked_again(bucket):
+    manifest = {
+        name: {"status": "failed: boom", "invalid": 0, "version": version}
+        for name, _, _, version in check_files(bucket, "sec-form-d/", dry_run=True)
+    }
+
+    assert {status for _, status, _, _ in check_files(bucket, "sec-form-d/", manifest=manifest)} == {"converted", "ok"}
+
+
+def test_main_keeps_a_manifest_of_the_local_files(bucket, tmp_path, monkeypatch, capsys):
+    manifest_path = tmp_path / "check_manifest.json"
+    monkeypatch.setattr(sys, "argv", ["check.py", "--local", bucket.root, "--workers", "2", "--manifest", str(manifest_path)])
+
+    assert check.main() == 0
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    assert {name: entry["status"] for name, entry in manifest.items()} == {
+        "sec-form-d/2020Q1/OFFERING.tsv": "converted",
+        "sec-form-d/2020Q2/OFFERING.tsv": "ok",
+    }
+    assert manifest["sec-form-d/2020Q1/OFFERING.tsv"]["invalid"] == 4
+
+    # The version of a converted file is the one it was rewritten with, so it isn't checked again
+    capsys.readouterr()
+    assert check.main() == 0
+    assert capsys.readouterr().out == "2 unchanged files skipped\n"
+
+    monkeypatch.setattr(sys, "argv", sys.argv + ["--full"])
+    assert check.main() == 0
+    assert "0 unchanged files skipped" in capsys.readouterr().out